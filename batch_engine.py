@@ -0,0 +1,369 @@
+import importlib
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+import psutil
+
+from model_registry import FASTER_QUANTIZE, YOLO_BACKEND
+from video_pipeline import LineCounter, new_counting_state
+
+# 检测方式 -> 视频处理模块
+VIDEO_MODULES = {
+    "YOLO": "process_video_with_YOLO",
+    "WBF": "process_video_with_WBF",
+}
+
+# 每个工作进程（模型 + 推理缓存 + 视频帧队列）的预估内存占用
+DEFAULT_WORKER_MEMORY_MB = {
+    "YOLO": 1500,
+    "WBF": 3000,
+}
+
+# 单个视频分片并行处理时，每个分片向前多处理的秒数（让跟踪器在分片起点前建立轨迹，并用于跨分片匹配轨迹ID）
+SHARD_OVERLAP_SECONDS = 10
+SHARD_MIN_SECONDS = 60     # 每个分片至少包含的秒数，视频太短时减少分片数
+SHARD_MATCH_IOU = 0.5      # 重叠区内相邻分片的两条轨迹平均IoU超过该值视为同一辆车
+# 分片处理不支持的参数：分片自行控制起止帧（不能再分段续接），各工作进程也不能共用同一个指标端口/文件
+SHARD_UNSUPPORTED_OPTIONS = ("resumable", "metrics_port", "metrics_path")
+
+
+def plan_workers(num_jobs, workers=None, detector="YOLO", worker_memory_mb=None):
+    """根据CPU核数、任务数和可用内存确定工作进程数"""
+    worker_memory_mb = worker_memory_mb or DEFAULT_WORKER_MEMORY_MB.get(detector, 2000)
+    available_mb = psutil.virtual_memory().available / (1024 * 1024)
+    memory_limit = int(available_mb // worker_memory_mb)
+    workers = workers or os.cpu_count() or 1
+    return max(1, min(workers, num_jobs, memory_limit))
+
+
+def prepare_models(options):
+    """
+    在父进程中完成工作进程共用的一次性准备：YOLO 使用导出格式时先导出，
+    避免多个工作进程同时写同一个导出文件。失败时返回错误信息，成功返回 None
+    """
+    from model_registry import export_yolo
+
+    backend = options.get("backend", YOLO_BACKEND)
+    if backend == "torch":
+        return None
+    try:
+        export_yolo(backend=backend)
+    except Exception as e:
+        return f"模型导出失败: {e}"
+    return None
+
+
+# 工作进程初始化失败的原因；初始化函数抛出异常会使进程池不断重启工作进程，因此记录下来由任务返回
+_worker_error = None
+
+
+def _init_worker(detector, torch_threads, options):
+    """工作进程初始化：限制线程数避免进程间争抢CPU，并按处理参数预加载本进程的模型"""
+    global _worker_error
+    try:
+        import torch
+        from model_registry import warm_up
+
+        torch.set_num_threads(torch_threads)
+        warm_up(use_faster=detector == "WBF", yolo_backend=options.get("backend", YOLO_BACKEND),
+                quantize_faster=options.get("quantize_faster", FASTER_QUANTIZE))
+    except Exception as e:
+        _worker_error = f"模型加载失败: {e}"
+
+
+def _process_video(detector, input_path, output_path, options):
+    """在工作进程中处理单个视频，返回 (输入路径, 输出路径, 结果, 错误信息)"""
+    if _worker_error is not None:
+        return input_path, output_path, None, _worker_error
+    try:
+        module = importlib.import_module(VIDEO_MODULES[detector])
+        result = module.count_vehicles_video(input_path, output_path, **options)
+        if result is None:
+            return input_path, output_path, None, "无法打开视频文件"
+        return input_path, output_path, result, None
+    except Exception as e:
+        return input_path, output_path, None, str(e)
+
+
+def process_videos_parallel(jobs, detector="YOLO", workers=None, worker_memory_mb=None, on_result=None,
+                            should_stop=None, **options):
+    """
+    多进程并行处理多个视频
+    jobs: [(input_path, output_path), ...]
+    on_result(done, total, input_path, output_path, result, error): 每个视频完成后立即回调
+    should_stop(): 返回 True 时终止所有工作进程（取消）
+    options: 传给 count_vehicles_video 的参数（batch_size、stride、counts_only 等）
+    返回按输入顺序排列的 [(input_path, output_path, result, error), ...]，取消时只包含已完成的视频
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    error = prepare_models(options)
+    if error is not None:
+        results = [(input_path, output_path, None, error) for input_path, output_path in jobs]
+        for done, job_result in enumerate(results, 1):
+            if on_result is not None:
+                on_result(done, len(jobs), *job_result)
+        return results
+    num_workers = plan_workers(len(jobs), workers, detector, worker_memory_mb)
+    torch_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    print(f"并行处理 {len(jobs)} 个视频 | 工作进程数: {num_workers}, 每进程线程数: {torch_threads}")
+
+    # spawn 方式启动，避免 fork 继承 torch/Qt 的线程状态
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(processes=num_workers, initializer=_init_worker, initargs=(detector, torch_threads, options))
+    pending = [(index, pool.apply_async(_process_video, (detector, input_path, output_path, options)))
+               for index, (input_path, output_path) in enumerate(jobs)]
+    results = {}
+    cancelled = False
+    try:
+        while pending:
+            if should_stop is not None and should_stop():
+                cancelled = True
+                break
+            still_pending = []
+            for index, async_result in pending:
+                if async_result.ready():
+                    results[index] = async_result.get()
+                    if on_result is not None:
+                        on_result(len(results), len(jobs), *results[index])
+                else:
+                    still_pending.append((index, async_result))
+            pending = still_pending
+            if pending:
+                time.sleep(0.2)
+    finally:
+        if cancelled:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+    if cancelled:
+        print(f"已取消 | 完成 {len(results)}/{len(jobs)} 个视频")
+    return [results[index] for index in sorted(results)]
+
+
+class _RecordingCounter(LineCounter):
+    """在指定帧范围内记录每条轨迹的框，用于和相邻分片的轨迹做匹配"""
+
+    def __init__(self, *args, windows=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.windows = windows  # [(name, start, end), ...]，帧号为全局帧号
+        self.recorded = {name: {} for name, _, _ in windows}
+
+    def update(self, boxes, track_ids, class_ids=None):
+        frame_index = self.tracked_vehicles.frame_index
+        for name, start, end in self.windows:
+            if start <= frame_index < end:
+                tracks = self.recorded[name]
+                for box, track_id in zip(boxes, track_ids):
+                    tracks.setdefault(int(track_id), {})[frame_index] = np.asarray(box, dtype=np.float32)
+        return super().update(boxes, track_ids, class_ids)
+
+
+def _process_shard(detector, input_path, segment_path, shard, options):
+    """
+    在工作进程中处理一个分片：先在仅计数模式下处理重叠区 [warmup_start, start)（只用于建立轨迹，
+    计数不计入结果），再处理分片自身 [start, end)。返回分片内的越线事件和两端重叠区内的轨迹
+    """
+    from video_io import VIDEO_BACKEND, open_reader
+
+    if _worker_error is not None:
+        return shard, None, _worker_error
+    try:
+        module = importlib.import_module(VIDEO_MODULES[detector])
+        warmup_start, start, end, overlap = shard["warmup_start"], shard["start"], shard["end"], shard["overlap"]
+        reader = open_reader(input_path, options.get("io_backend", VIDEO_BACKEND))
+        if not reader.is_opened():
+            return shard, None, "无法打开视频文件"
+        fps, frame_height = reader.fps, reader.height
+        reader.release()
+
+        tracker, counter = new_counting_state(fps, frame_height)
+        counter = _RecordingCounter(counter.baseline_y, max_track_age=tracker.max_lost_frames, fps=fps,
+                                    windows=[("head", warmup_start, start), ("tail", end - overlap, end)])
+        counter.tracked_vehicles.frame_index = warmup_start  # 事件使用全局帧号
+        state = (tracker, counter)
+        if warmup_start < start:
+            # 重叠区只计数、不输出视频，去掉与输出相关的参数
+            warmup_options = {key: value for key, value in options.items()
+                              if key not in ("counts_only", "codec", "crf")}
+            module.count_vehicles_video(input_path, None, counts_only=True, start_frame=warmup_start,
+                                        end_frame=start, state=state, **warmup_options)
+        result = module.count_vehicles_video(input_path, segment_path, start_frame=start, end_frame=end, state=state,
+                                             **options)
+        if result is None:
+            return shard, None, "无法打开视频文件"
+        return shard, {
+            "events": [event for event in counter.events if event["frame"] >= start],
+            "head": counter.recorded["head"],
+            "tail": counter.recorded["tail"],
+            "frames": result["frames"],
+            "stage_times": result["stage_times"]
+        }, None
+    except Exception as e:
+        return shard, None, str(e)
+
+
+def plan_shards(frame_count, fps, shards, overlap_seconds=SHARD_OVERLAP_SECONDS, min_seconds=SHARD_MIN_SECONDS):
+    """把 [0, frame_count) 均分为若干分片，每个分片（第一个除外）向前多处理 overlap 帧"""
+    fps = fps or 30
+    shards = max(1, min(shards, int(frame_count // max(min_seconds * fps, 1))))
+    overlap = int(overlap_seconds * fps)
+    bounds = np.linspace(0, frame_count, shards + 1).astype(int)
+    return [{"index": i, "warmup_start": max(0, int(bounds[i]) - overlap), "start": int(bounds[i]),
+             "end": int(bounds[i + 1]), "overlap": overlap}
+            for i in range(shards)]
+
+
+def _mean_iou(track_a, track_b):
+    """两条轨迹在共同出现的帧上的平均IoU，没有共同帧时为 0"""
+    frames = track_a.keys() & track_b.keys()
+    if not frames:
+        return 0.0
+    a = np.stack([track_a[frame] for frame in frames])
+    b = np.stack([track_b[frame] for frame in frames])
+    inter_w = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+    return float(np.mean(inter / np.maximum(union, 1e-6)))
+
+
+def _match_tracks(tail, head, iou_threshold=SHARD_MATCH_IOU):
+    """重叠区内前一分片的轨迹（tail）与后一分片的轨迹（head）贪心匹配，返回 {head_id: tail_id}"""
+    pairs = sorted(((_mean_iou(tail[tail_id], head[head_id]), head_id, tail_id)
+                    for tail_id in tail for head_id in head), reverse=True)
+    matched, used = {}, set()
+    for iou, head_id, tail_id in pairs:
+        if iou < iou_threshold:
+            break
+        if head_id not in matched and tail_id not in used:
+            matched[head_id] = tail_id
+            used.add(tail_id)
+    return matched
+
+
+def reconcile_shards(shard_results):
+    """
+    合并各分片的越线事件：
+    - 重叠区内匹配到的轨迹沿用前一分片的全局ID，其余轨迹分配新的全局ID
+    - 同一全局ID只计数一次（前一分片已经计数的车辆在后一分片再次越线时丢弃），累计计数按事件顺序重新计算
+    shard_results: 按分片顺序排列的 _process_shard 结果
+    """
+    global_ids = {}  # (分片序号, 分片内轨迹ID) -> 全局ID
+
+    def global_id(shard_index, track_id):
+        key = (shard_index, track_id)
+        if key not in global_ids:
+            global_ids[key] = len(global_ids) + 1
+        return global_ids[key]
+
+    for index in range(1, len(shard_results)):
+        for head_id, tail_id in _match_tracks(shard_results[index - 1]["tail"], shard_results[index]["head"]).items():
+            global_ids[(index, head_id)] = global_id(index - 1, tail_id)
+
+    counted = set()
+    events, per_class = [], {}
+    total_in = total_out = 0
+    for index, shard_result in enumerate(shard_results):
+        for event in shard_result["events"]:
+            track_id = global_id(index, event["track_id"])
+            if track_id in counted:
+                continue
+            counted.add(track_id)
+            if event["direction"] == "in":
+                total_in += 1
+            else:
+                total_out += 1
+            class_counts = per_class.setdefault(event["class_name"], {"in": 0, "out": 0})
+            class_counts[event["direction"]] += 1
+            events.append(dict(event, track_id=track_id, total_in=total_in, total_out=total_out))
+    return {"total_in": total_in, "total_out": total_out, "per_class": per_class, "events": events}
+
+
+def process_video_sharded(input_path, output_path=None, detector="YOLO", shards=None, workers=None,
+                          overlap_seconds=SHARD_OVERLAP_SECONDS, worker_memory_mb=None, **options):
+    """
+    把一个长视频按时间切分为多个分片，在多个工作进程中并行处理，返回与 count_vehicles_video 格式相同的结果
+    每个分片向前多处理 overlap_seconds 秒，使跟踪器在分片起点已有轨迹；分片边界处的轨迹ID和越线事件
+    由 reconcile_shards 统一，计数与顺序处理一致
+    output_path 不为空时各分片分别输出视频，最后无损拼接（画面中叠加的 In/Out 为各分片自己的计数）
+    options: 传给 count_vehicles_video 的参数（batch_size、stride、tile_size 等），不支持 SHARD_UNSUPPORTED_OPTIONS
+    """
+    from checkpoint import concat_segments
+    from video_io import VIDEO_BACKEND, open_reader
+
+    unsupported = [key for key in SHARD_UNSUPPORTED_OPTIONS if options.get(key) not in (None, False)]
+    if unsupported:
+        raise ValueError(f"分片处理不支持参数: {', '.join(unsupported)}")
+    reader = open_reader(input_path, options.get("io_backend", VIDEO_BACKEND))
+    if not reader.is_opened():
+        print(f"无法打开视频文件: {input_path}")
+        return None
+    frame_count, fps = reader.frame_count, reader.fps
+    reader.release()
+    if options.get("counts_only"):
+        output_path = None
+    if frame_count <= 0:
+        # 无法获取总帧数（如部分流媒体格式）时不能切分，退回顺序处理
+        print(f"无法获取视频总帧数，改为顺序处理: {input_path}")
+        return importlib.import_module(VIDEO_MODULES[detector]).count_vehicles_video(input_path, output_path, **options)
+
+    num_workers = plan_workers(shards or os.cpu_count() or 1, workers, detector, worker_memory_mb)
+    plan = plan_shards(frame_count, fps, shards or num_workers, overlap_seconds)
+    num_workers = min(num_workers, len(plan))
+    torch_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    print(f"分片处理 {input_path} | {frame_count} 帧, 分片数: {len(plan)}, 工作进程数: {num_workers}, "
+          f"每进程线程数: {torch_threads}")
+
+    error = prepare_models(options)
+    if error is not None:
+        print(error)
+        return None
+
+    segment_dir = output_path + ".shards" if output_path else None
+    if segment_dir:
+        os.makedirs(segment_dir, exist_ok=True)
+    extension = os.path.splitext(output_path)[1] if output_path else ""
+    segment_paths = [os.path.join(segment_dir, f"shard_{shard['index']:03d}{extension}") if segment_dir else None
+                     for shard in plan]
+
+    start_time = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=num_workers, initializer=_init_worker,
+                      initargs=(detector, torch_threads, options)) as pool:
+        outputs = pool.starmap(_process_shard, [(detector, input_path, segment_path, shard, options)
+                                                for shard, segment_path in zip(plan, segment_paths)])
+    elapsed = time.perf_counter() - start_time
+
+    errors = [(shard, error) for shard, _, error in outputs if error is not None]
+    if errors:
+        for shard, error in errors:
+            print(f"分片 {shard['index']} 处理失败: {error}")
+        return None
+    shard_results = [shard_result for _, shard_result, _ in outputs]
+    result = reconcile_shards(shard_results)
+
+    if segment_dir:
+        if not concat_segments(segment_paths, output_path):
+            print(f"分片视频保留在: {segment_dir}")
+            return None
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        print(f"结果视频保存至: {output_path}")
+
+    frames = sum(shard_result["frames"] for shard_result in shard_results)
+    result.update({
+        "frames": frames,
+        "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        "shards": [{"start": shard["start"], "end": shard["end"], "frames": shard_result["frames"],
+                    "events": len(shard_result["events"]), "stage_times": shard_result["stage_times"]}
+                   for shard, shard_result in zip(plan, shard_results)]
+    })
+    print(f"处理完成 | 入场车辆数: {result['total_in']}, 出场车辆数: {result['total_out']}, "
+          f"{frames} 帧, {result['fps']} 帧/秒")
+    return result
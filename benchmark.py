@@ -0,0 +1,297 @@
+import glob
+import json
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+from video_pipeline import latency_summary
+
+# 基准测试默认配置
+BENCHMARK_DIR = "./output/benchmarks"    # 结果JSON及合成素材的保存目录
+ENTRY_POINTS = ("picture_YOLO", "picture_WBF", "video_YOLO", "video_WBF")
+RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080))
+DENSITIES = (5, 40)                      # 每帧画面中的车辆数
+VIDEO_FRAMES = 120
+PICTURE_COUNT = 20
+REGRESSION_TOLERANCE = 0.1               # FPS 下降或延迟/内存上升超过该比例视为退化
+
+# 合成车辆的颜色（BGR）
+_VEHICLE_COLORS = [(40, 40, 200), (200, 200, 200), (30, 30, 30), (200, 120, 40), (40, 160, 220), (60, 140, 60)]
+
+
+def _scene(width, height, density, seed):
+    """生成车辆的初始位置、尺寸、颜色和速度：一半向下行驶、一半向上行驶，会穿过画面中间的计数线"""
+    rng = np.random.default_rng(seed)
+    scale = width / 1280
+    vehicles = []
+    for i in range(density):
+        w = int(rng.uniform(30, 60) * scale)
+        h = int(rng.uniform(50, 110) * scale)
+        direction = 1 if i % 2 == 0 else -1
+        vehicles.append({
+            "x": int(rng.uniform(0, width - w)),
+            "y": float(rng.uniform(-h, height)),
+            "w": w,
+            "h": h,
+            "color": _VEHICLE_COLORS[i % len(_VEHICLE_COLORS)],
+            "speed": direction * rng.uniform(2, 6) * height / 720
+        })
+    return vehicles
+
+
+def _draw_scene(width, height, vehicles):
+    """灰色路面 + 车道线，车辆为带车窗的矩形"""
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    for x in range(width // 8, width, width // 8):
+        for y in range(0, height, 60):
+            cv2.line(frame, (x, y), (x, y + 30), (220, 220, 220), 2)
+    for v in vehicles:
+        x1, y1 = v["x"], int(v["y"])
+        x2, y2 = x1 + v["w"], y1 + v["h"]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), v["color"], -1)
+        window_y = y1 + v["h"] // 5 if v["speed"] > 0 else y2 - v["h"] // 3
+        cv2.rectangle(frame, (x1 + 4, window_y), (x2 - 4, window_y + v["h"] // 6), (50, 30, 20), -1)
+    return frame
+
+
+def synthetic_frames(width, height, density, frames, seed=0):
+    """逐帧生成合成交通画面，超出画面的车辆从另一侧重新进入"""
+    vehicles = _scene(width, height, density, seed)
+    for _ in range(frames):
+        yield _draw_scene(width, height, vehicles)
+        for v in vehicles:
+            v["y"] += v["speed"]
+            if v["y"] > height:
+                v["y"] = -v["h"]
+            elif v["y"] < -v["h"]:
+                v["y"] = height
+
+
+def write_synthetic_video(path, width, height, density, frames=VIDEO_FRAMES, fps=30, seed=0):
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for frame in synthetic_frames(width, height, density, frames, seed):
+        out.write(frame)
+    out.release()
+    return path
+
+
+def write_synthetic_pictures(directory, width, height, density, count=PICTURE_COUNT, seed=0):
+    """每张图片使用不同的随机场景"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        frame = next(synthetic_frames(width, height, density, 1, seed + i))
+        path = os.path.join(directory, f"{i:03d}.jpg")
+        cv2.imwrite(path, frame)
+        paths.append(path)
+    return paths
+
+
+def _peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+
+
+def _bench_pictures(entry, paths, output_dir, options):
+    """逐张调用图片入口函数，每张图片的耗时即单帧延迟（包含读图、推理、绘制和保存）"""
+    if entry == "picture_YOLO":
+        from process_picture_with_YOLO import count_vehicles_picture
+    else:
+        from process_picture_with_WBF import count_vehicles_picture
+
+    # 预热：加载模型并完成首次推理，不计入结果
+    count_vehicles_picture(paths[0], os.path.join(output_dir, "warmup.jpg"), **options)
+    latencies = []
+    wall_start = time.perf_counter()
+    for path in paths:
+        start = time.perf_counter()
+        count_vehicles_picture(path, os.path.join(output_dir, os.path.basename(path)), **options)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - wall_start
+    return {
+        "frames": len(paths),
+        "fps": round(len(paths) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "stage_times": {"picture": {"total_s": round(elapsed, 4),
+                                    "ms_per_frame": round(elapsed * 1000 / len(paths), 3)}}
+    }
+
+
+def _bench_video(entry, video_path, output_path, options):
+    """调用视频入口函数，FPS、单帧延迟和各阶段耗时取自流程返回的结果"""
+    from model_registry import warm_up
+
+    if entry == "video_YOLO":
+        from process_video_with_YOLO import count_vehicles_video
+        warm_up()
+    else:
+        from process_video_with_WBF import count_vehicles_video
+        warm_up(use_faster=True)
+
+    result = count_vehicles_video(video_path, output_path, **options)
+    if result is None:
+        raise RuntimeError(f"视频处理失败: {video_path}")
+    return {
+        "frames": result["frames"],
+        "fps": result["fps"],
+        "latency_ms": result["latency_ms"],
+        "stage_times": result["stage_times"],
+        "total_in": result["total_in"],
+        "total_out": result["total_out"]
+    }
+
+
+def _run_case(case, media_path, output_dir):
+    """在独立子进程中运行一个用例：模型加载和峰值内存互不影响"""
+    try:
+        if case["entry"].startswith("picture"):
+            paths = sorted(glob.glob(os.path.join(media_path, "*.jpg")))
+            metrics = _bench_pictures(case["entry"], paths, output_dir, case["options"])
+        else:
+            output_path = os.path.join(output_dir, "result.mp4")
+            metrics = _bench_video(case["entry"], media_path, output_path, case["options"])
+    except Exception as e:
+        metrics = {"error": f"{type(e).__name__}: {e}"}
+    metrics["peak_rss_mb"] = _peak_rss_mb()
+    return metrics
+
+
+def case_name(entry, width, height, density, options=None):
+    name = f"{entry}/{width}x{height}/d{density}"
+    if options:
+        name += "/" + ",".join(f"{key}={value}" for key, value in sorted(options.items()))
+    return name
+
+
+def run_benchmark(entry_points=ENTRY_POINTS, resolutions=RESOLUTIONS, densities=DENSITIES, options=None,
+                  video_frames=VIDEO_FRAMES, picture_count=PICTURE_COUNT, work_dir=BENCHMARK_DIR):
+    """
+    对每个入口函数 × 分辨率 × 车辆密度运行一次基准测试，合成素材按配置生成并缓存在 work_dir/media
+    options: {entry: {参数名: 值}}，传给对应入口函数（如 {"video_YOLO": {"batch_size": 4}}）
+    返回可直接保存为JSON的结果
+    """
+    options = options or {}
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    cases = []
+    context = get_context("spawn")
+    for width, height in resolutions:
+        for density in densities:
+            tag = f"{width}x{height}_d{density}"
+            video_path = os.path.join(media_dir, f"{tag}_{video_frames}f.mp4")
+            picture_dir = os.path.join(media_dir, f"{tag}_{picture_count}p")
+            for entry in entry_points:
+                if entry.startswith("picture"):
+                    media_path = picture_dir
+                    if not os.path.isdir(picture_dir):
+                        write_synthetic_pictures(picture_dir, width, height, density, picture_count)
+                else:
+                    media_path = video_path
+                    if not os.path.exists(video_path):
+                        write_synthetic_video(video_path, width, height, density, video_frames)
+
+                case = {
+                    "name": case_name(entry, width, height, density, options.get(entry)),
+                    "entry": entry,
+                    "resolution": [width, height],
+                    "density": density,
+                    "options": options.get(entry, {})
+                }
+                output_dir = os.path.join(work_dir, "results", case["name"].replace("/", "_"))
+                os.makedirs(output_dir, exist_ok=True)
+                print(f"=== {case['name']} ===")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    case.update(pool.submit(_run_case, case, media_path, output_dir).result())
+                if "error" in case:
+                    print(f"失败: {case['error']}")
+                else:
+                    print(f"FPS {case['fps']}, 延迟 p50/p95/p99 {case['latency_ms']['p50']}/"
+                          f"{case['latency_ms']['p95']}/{case['latency_ms']['p99']} ms, "
+                          f"峰值内存 {case['peak_rss_mb']} MB")
+                cases.append(case)
+
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": {
+            "python": platform.python_version(),
+            "system": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count()
+        },
+        "cases": cases
+    }
+
+
+def save_results(results, work_dir=BENCHMARK_DIR):
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"基准测试结果保存至: {path}")
+    return path
+
+
+def latest_results(work_dir=BENCHMARK_DIR, exclude=None):
+    """返回 work_dir 中最近一次的结果文件路径（排除 exclude），没有时返回 None"""
+    paths = [path for path in sorted(glob.glob(os.path.join(work_dir, "benchmark_*.json"))) if path != exclude]
+    return paths[-1] if paths else None
+
+
+def compare_results(current, previous, tolerance=REGRESSION_TOLERANCE):
+    """
+    按用例名称对比两次结果，FPS 下降、p95 延迟或峰值内存上升超过 tolerance 时视为退化
+    current/previous 为结果字典或JSON文件路径，返回退化列表 [{"name", "metric", "previous", "current", "change"}]
+    """
+    if isinstance(current, str):
+        with open(current, encoding="utf-8") as f:
+            current = json.load(f)
+    if isinstance(previous, str):
+        with open(previous, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    previous_cases = {case["name"]: case for case in previous["cases"] if "error" not in case}
+    regressions = []
+    for case in current["cases"]:
+        before = previous_cases.get(case["name"])
+        if before is None or "error" in case:
+            continue
+        # (指标, 取值, 数值越大越好)
+        metrics = [
+            ("fps", lambda c: c["fps"], True),
+            ("latency_p95_ms", lambda c: c["latency_ms"]["p95"], False),
+            ("peak_rss_mb", lambda c: c["peak_rss_mb"], False)
+        ]
+        for metric, value, higher_is_better in metrics:
+            old, new = value(before), value(case)
+            if not old:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append({"name": case["name"], "metric": metric, "previous": old, "current": new,
+                                    "change": round(change, 4)})
+
+    for row in regressions:
+        print(f"退化: {row['name']} {row['metric']} {row['previous']} -> {row['current']} ({row['change']:+.1%})")
+    if not regressions:
+        print(f"与上次结果（{previous['created']}）相比没有超过 {tolerance:.0%} 的退化")
+    return regressions
+
+
+if __name__ == "__main__":
+    results = run_benchmark()
+    path = save_results(results)
+    previous_path = latest_results(exclude=path)
+    if previous_path is not None:
+        compare_results(results, previous_path)
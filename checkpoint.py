@@ -0,0 +1,250 @@
+import os
+import pickle
+import shutil
+import subprocess
+import time
+
+from video_io import VIDEO_BACKEND, open_reader
+from video_pipeline import new_counting_state, run_video_counting
+
+# 每段包含的帧数（30fps 约 5 分钟），每处理完一段保存一次检查点
+SEGMENT_FRAMES = 9000
+CHECKPOINT_FILE = "checkpoint.pkl"
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_dir_for(input_video_path, output_video_path=None, detector=None):
+    """
+    分段视频和检查点的默认目录：输出视频旁的 <输出文件名>.<检测方式>.parts，仅计数模式时放在输入视频旁
+    不同检测方式（YOLO/WBF）对同一视频的任务使用不同的目录
+    """
+    name = output_video_path or input_video_path
+    return f"{name}.{detector}.parts" if detector else name + ".parts"
+
+
+def _source_signature(input_video_path):
+    """输入文件的大小和修改时间，文件变化后旧的检查点失效"""
+    stat = os.stat(input_video_path)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def _track_id_counter():
+    """旧版本 ultralytics 的轨迹ID是全局计数器，需要随检查点保存"""
+    from ultralytics.trackers.basetrack import BaseTrack
+    return BaseTrack._count
+
+
+def _restore_track_id_counter(value):
+    from ultralytics.trackers.basetrack import BaseTrack
+    BaseTrack._count = max(BaseTrack._count, value)
+
+
+def save_checkpoint(checkpoint_dir, checkpoint):
+    """先写临时文件再替换，进程在写入过程中崩溃也不会损坏上一个检查点"""
+    path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(checkpoint_dir, input_video_path, options):
+    """读取检查点，不存在、版本不符或输入视频/处理参数已改变时返回 None"""
+    path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+    except Exception as e:
+        print(f"无法读取检查点 {path}: {e}")
+        return None
+    if (checkpoint.get("version") != CHECKPOINT_VERSION
+            or checkpoint.get("source") != _source_signature(input_video_path)
+            or checkpoint.get("options") != options):
+        print(f"检查点与当前任务不匹配，重新开始: {path}")
+        return None
+    # 只有记录在检查点中的分段是完整的，缺失时无法续接
+    if any(not os.path.exists(os.path.join(checkpoint_dir, name)) for name in checkpoint["segments"]):
+        print(f"检查点中的分段视频缺失，重新开始: {checkpoint_dir}")
+        return None
+    return checkpoint
+
+
+def _ffmpeg_binary():
+    path = shutil.which("ffmpeg")
+    if path is None:
+        try:
+            import imageio_ffmpeg
+            path = imageio_ffmpeg.get_ffmpeg_exe()
+        except (ImportError, RuntimeError):
+            pass
+    return path
+
+
+def _concat_pyav(segment_paths, output_path):
+    """PyAV 直接复制压缩数据包并平移时间戳（不重新编码）"""
+    import av
+
+    with av.open(output_path, mode="w") as output:
+        out_stream = None
+        end = None
+        for path in segment_paths:
+            with av.open(path) as segment:
+                in_stream = segment.streams.video[0]
+                if out_stream is None:
+                    out_stream = output.add_stream_from_template(in_stream)
+                offset = None
+                for packet in segment.demux(in_stream):
+                    if packet.dts is None:
+                        continue
+                    # 每段的第一个包接在上一段最后一个包之后（含B帧时段首 dts 可能为负）
+                    if offset is None:
+                        offset = 0 if end is None else end - packet.dts
+                    packet.dts += offset
+                    packet.pts = packet.pts + offset if packet.pts is not None else None
+                    end = max(end or packet.dts, packet.dts + (packet.duration or 1))
+                    packet.stream = out_stream
+                    output.mux(packet)
+
+
+def concat_segments(segment_paths, output_path):
+    """
+    无损合并分段视频（流复制，不重新编码）：优先使用 ffmpeg 的 concat，找不到 ffmpeg 时使用 PyAV
+    成功返回 True
+    """
+    if len(segment_paths) == 1:
+        shutil.copyfile(segment_paths[0], output_path)
+        return True
+
+    ffmpeg = _ffmpeg_binary()
+    if ffmpeg is not None:
+        list_path = output_path + ".concat.txt"
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in segment_paths:
+                f.write("file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''")))
+        try:
+            completed = subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                        "-i", list_path, "-c", "copy", output_path],
+                                       capture_output=True, text=True)
+        finally:
+            os.remove(list_path)
+        if completed.returncode == 0:
+            return True
+        print(f"ffmpeg 合并失败: {completed.stderr.strip()}")
+
+    try:
+        _concat_pyav(segment_paths, output_path)
+        return True
+    except ImportError:
+        print("无法合并分段视频: 未找到 ffmpeg，且未安装 PyAV")
+    except Exception as e:
+        print(f"无法合并分段视频: {e}")
+    return False
+
+
+def _merge_stage_times(merged, stage_times, frames):
+    """按帧数加权合并各段的阶段耗时"""
+    for stage, info in stage_times.items():
+        total = merged.setdefault(stage, {"total_s": 0.0, "ms_per_frame": 0.0, "_frames": 0})
+        total["total_s"] = round(total["total_s"] + info["total_s"], 4)
+        weighted = total["ms_per_frame"] * total["_frames"] + info["ms_per_frame"] * frames
+        total["ms_per_frame"] = weighted / max(total["_frames"] + frames, 1)
+        total["_frames"] += frames
+
+
+def run_video_counting_resumable(input_video_path, output_video_path, detect_batch, checkpoint_dir=None,
+                                 segment_frames=SEGMENT_FRAMES, keep_segments=False, detector_config=None, **options):
+    """
+    可续接的视频计数：视频按 segment_frames 帧分段处理，每段输出为单独的视频文件，
+    每处理完一段就保存检查点（帧位置、跟踪器、轨迹计数状态、累计计数和已完成的分段列表）
+    进程崩溃或被取消后用相同参数再次调用，会从最后一个检查点继续，已完成的分段不会重新编码
+    全部处理完后把分段无损拼接为 output_video_path，并删除检查点目录（keep_segments=True 时保留）
+    无法打开视频时返回 None；分段无法合并时抛出 RuntimeError（分段和检查点保留，可在安装 ffmpeg 后重新合并）
+    detector_config: 检测方式及检测参数（如 {"detector": "YOLO", "tile_size": ..., "roi": ...}），
+    与检查点中记录的不一致时不续接，避免沿用其他检测配置的跟踪状态和计数
+    options: 传给 run_video_counting 的其余参数（batch_size、stride、counts_only 等）
+    """
+    counts_only = options.get("counts_only", False) or output_video_path is None
+    detector_config = dict(detector_config or {})
+    checkpoint_dir = checkpoint_dir or checkpoint_dir_for(input_video_path, output_video_path,
+                                                          detector_config.get("detector"))
+    if not os.path.exists(input_video_path):
+        print(f"无法打开视频文件: {input_video_path}")
+        return None
+
+    # 影响计数结果的参数必须与检查点一致
+    signature = dict(detector_config, stride=options.get("stride", 1), batch_size=options.get("batch_size", 1),
+                     segment_frames=segment_frames, counts_only=counts_only)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint = load_checkpoint(checkpoint_dir, input_video_path, signature)
+    if checkpoint is None:
+        reader = open_reader(input_video_path, options.get("io_backend", VIDEO_BACKEND))
+        if not reader.is_opened():
+            print(f"无法打开视频文件: {input_video_path}")
+            return None
+        fps, frame_height = reader.fps, reader.height
+        reader.release()
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "source": _source_signature(input_video_path),
+            "options": signature,
+            "frame_index": 0,
+            "segments": [],
+            "state": new_counting_state(fps, frame_height),
+            "finished": False
+        }
+    else:
+        _restore_track_id_counter(checkpoint["track_id_counter"])
+        print(f"从检查点继续: 第 {checkpoint['frame_index']} 帧，已完成 {len(checkpoint['segments'])} 段")
+
+    extension = os.path.splitext(output_video_path)[1] if not counts_only else ""
+    start_time = time.perf_counter()
+    processed = 0
+    stage_times = {}
+    while not checkpoint["finished"]:
+        start_frame = checkpoint["frame_index"]
+        segment_name = f"segment_{len(checkpoint['segments']):05d}{extension}"
+        segment_path = None if counts_only else os.path.join(checkpoint_dir, segment_name)
+        result = run_video_counting(input_video_path, segment_path, detect_batch,
+                                    start_frame=start_frame, end_frame=start_frame + segment_frames,
+                                    state=checkpoint["state"], **options)
+        if result is None:
+            return None
+        frames = result["frames"]
+        processed += frames
+        _merge_stage_times(stage_times, result["stage_times"], frames)
+
+        if frames > 0 and segment_path is not None:
+            checkpoint["segments"].append(segment_name)
+        elif segment_path is not None and os.path.exists(segment_path):
+            os.remove(segment_path)
+        checkpoint["frame_index"] = start_frame + frames
+        checkpoint["finished"] = frames < segment_frames
+        checkpoint["track_id_counter"] = _track_id_counter()
+        save_checkpoint(checkpoint_dir, checkpoint)
+
+    if not counts_only:
+        segment_paths = [os.path.join(checkpoint_dir, name) for name in checkpoint["segments"]]
+        if not segment_paths or not concat_segments(segment_paths, output_video_path):
+            raise RuntimeError(f"无法合并分段视频，分段视频保留在: {checkpoint_dir}")
+        print(f"已合并 {len(segment_paths)} 段视频: {output_video_path}")
+    if not keep_segments:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    _, counter = checkpoint["state"]
+    elapsed = time.perf_counter() - start_time
+    for info in stage_times.values():
+        del info["_frames"]
+        info["ms_per_frame"] = round(info["ms_per_frame"], 3)
+    return {
+        "total_in": counter.total_in,
+        "total_out": counter.total_out,
+        "per_class": counter.per_class,
+        "events": counter.events,
+        "frames": checkpoint["frame_index"],
+        "frames_this_run": processed,
+        "segments": len(checkpoint["segments"]),
+        "fps": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        "stage_times": stage_times,
+        "track_store": counter.tracked_vehicles.stats()
+    }
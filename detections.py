@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def _empty_arrays():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int)
+
+
+def normalize_boxes(boxes, width, height):
+    """像素坐标 -> 归一化坐标（整体运算，不逐框循环）"""
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4) / scale
+
+
+def to_pixels(boxes, width, height):
+    """归一化坐标 -> 像素坐标（整体运算，不逐框循环）"""
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale
+
+
+def yolo_to_arrays(result, width=None, height=None):
+    """
+    将Ultralytics的单张图片结果转换为 (boxes, scores, labels) 数组
+    给出 width/height 时返回归一化坐标，否则返回像素坐标
+    每个张量只做一次设备->主机拷贝
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return _empty_arrays()
+    xyxy = boxes.xyxy.cpu().numpy()
+    scores = boxes.conf.cpu().numpy()
+    labels = boxes.cls.cpu().numpy().astype(int)
+    if width is not None and height is not None:
+        xyxy = normalize_boxes(xyxy, width, height)
+    return xyxy, scores, labels
+
+
+def faster_to_arrays(instances, width=None, height=None):
+    """
+    将detectron2的Instances转换为 (boxes, scores, labels) 数组
+    给出 width/height 时返回归一化坐标，否则返回像素坐标
+    每个张量只做一次设备->主机拷贝
+    """
+    if len(instances) == 0:
+        return _empty_arrays()
+    xyxy = instances.pred_boxes.tensor.cpu().numpy()
+    scores = instances.scores.cpu().numpy()
+    labels = instances.pred_classes.cpu().numpy().astype(int)
+    if width is not None and height is not None:
+        xyxy = normalize_boxes(xyxy, width, height)
+    return xyxy, scores, labels
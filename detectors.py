@@ -0,0 +1,63 @@
+import numpy as np
+import torch
+
+from detections import yolo_to_arrays, faster_to_arrays, normalize_boxes, to_pixels
+from model_registry import inference_lock
+from wbf import weighted_boxes_fusion
+
+# WBF融合参数（给YOLO更高的权重）
+WBF_WEIGHTS = [2, 1]
+WBF_IOU_THR = 0.5
+WBF_SKIP_BOX_THR = 0.4
+
+
+def detect_yolo(model, images, conf=0.5, iou=0.7, classes=None):
+    """
+    YOLO批量推理：images 中的所有图片在一次前向传播中完成
+    返回每张图片的像素坐标 (boxes, scores, labels)
+    模型在线程间共享（见 model_registry），同一模型的推理按锁串行
+    """
+    with inference_lock(model):
+        results = model.predict(list(images), conf=conf, iou=iou, classes=classes, verbose=False)
+    return [yolo_to_arrays(result) for result in results]
+
+
+def predict_faster_batch(predictor, images):
+    """
+    DefaultPredictor 只接受单张图片，这里按其预处理流程组装批次，
+    直接调用底层模型完成一次前向传播，返回与 DefaultPredictor 相同格式的输出列表
+    """
+    inputs = []
+    for img in images:
+        if predictor.input_format == "RGB":
+            img = img[:, :, ::-1]
+        height, width = img.shape[:2]
+        image = predictor.aug.get_transform(img).apply_image(img)
+        image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1))
+        image = image.to(predictor.cfg.MODEL.DEVICE)
+        inputs.append({"image": image, "height": height, "width": width})
+    with torch.no_grad():
+        return predictor.model(inputs)
+
+
+def detect_faster(predictor, images):
+    """Faster R-CNN批量推理，返回每张图片的像素坐标 (boxes, scores, labels)"""
+    with inference_lock(predictor):
+        outputs = predict_faster_batch(predictor, images)
+    return [faster_to_arrays(output["instances"]) for output in outputs]
+
+
+def fuse_wbf(yolo_detections, faster_detections, width, height):
+    """对两个模型的像素坐标检测结果做WBF融合，返回像素坐标 (boxes, scores, labels)"""
+    yolo_boxes, yolo_scores, yolo_labels = yolo_detections
+    faster_boxes, faster_scores, faster_labels = faster_detections
+
+    fused_boxes, fused_scores, fused_labels = weighted_boxes_fusion(
+        [normalize_boxes(yolo_boxes, width, height), normalize_boxes(faster_boxes, width, height)],
+        [yolo_scores, faster_scores],
+        [yolo_labels, faster_labels],
+        weights=WBF_WEIGHTS,
+        iou_thr=WBF_IOU_THR,
+        skip_box_thr=WBF_SKIP_BOX_THR
+    )
+    return to_pixels(fused_boxes, width, height), fused_scores, np.asarray(fused_labels).astype(int)
@@ -0,0 +1,222 @@
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from detectors import detect_yolo, detect_faster, fuse_wbf
+from model_registry import FASTER_QUANTIZE, YOLO_BACKEND, get_yolo, get_faster_rcnn
+from roi import with_roi
+from tiling import DEFAULT_TILE_OVERLAP, tiled
+from video_pipeline import StageTimer
+
+# 自适应集成的默认触发条件
+ADAPTIVE_EVERY_N = 10            # 至少每 N 帧运行一次第二个模型
+ADAPTIVE_UNCERTAIN_SCORE = 0.7   # 低于该置信度的主模型检测框视为不确定
+ADAPTIVE_UNCERTAIN_RATIO = 0.3   # 不确定框占比超过该值时运行第二个模型
+ADAPTIVE_DENSE_COUNT = 40        # 主模型检测框数超过该值（密集场景）时运行第二个模型
+
+
+class EnsembleDetector:
+    """
+    集成检测器：多个相互独立的检测器同时处理同一批图片，全部完成后再融合
+    torch 推理时会释放GIL，用线程即可并行，每批耗时接近最慢的单个检测器而不是所有检测器之和
+    detectors: [(name, detect_fn), ...]，detect_fn(images) 返回每张图片的像素坐标 (boxes, scores, labels)
+    fuse(*detections, width, height): 把各检测器对同一张图片的结果融合为一个 (boxes, scores, labels)
+    """
+
+    def __init__(self, detectors, fuse, parallel=True):
+        self.detectors = list(detectors)
+        self.fuse = fuse
+        self.timer = StageTimer()
+        # 第一个检测器在调用线程上运行，其余的交给线程池
+        self._pool = None
+        if parallel and len(self.detectors) > 1:
+            self._pool = ThreadPoolExecutor(max_workers=len(self.detectors) - 1, thread_name_prefix="ensemble")
+
+    def _timed(self, name, detect_fn, images):
+        start = time.perf_counter()
+        detections = detect_fn(images)
+        # 每个检测器只在一个线程中运行，各自写入自己的阶段
+        self.timer.add(f"detect_{name}", time.perf_counter() - start, len(images))
+        return detections
+
+    def run(self, images):
+        """运行所有检测器，返回与 detectors 顺序一致的检测结果列表"""
+        start = time.perf_counter()
+        if self._pool is None:
+            outputs = [self._timed(name, detect_fn, images) for name, detect_fn in self.detectors]
+        else:
+            futures = [self._pool.submit(self._timed, name, detect_fn, images)
+                       for name, detect_fn in self.detectors[1:]]
+            name, detect_fn = self.detectors[0]
+            outputs = [self._timed(name, detect_fn, images)] + [future.result() for future in futures]
+        self.timer.add("ensemble", time.perf_counter() - start, len(images))
+        return outputs
+
+    def __call__(self, images):
+        outputs = self.run(images)
+        start = time.perf_counter()
+        fused = [self.fuse(*detections, img.shape[1], img.shape[0]) for img, detections in zip(images, zip(*outputs))]
+        self.timer.add("fuse", time.perf_counter() - start, len(images))
+        return fused
+
+    def stage_times(self):
+        """各检测器、融合（fuse）及整体（ensemble）的耗时统计，格式与 StageTimer.summary 相同"""
+        return self.timer.summary()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class AdaptiveEnsembleDetector:
+    """
+    自适应集成检测器：主模型（YOLO）每帧运行，第二个模型（Faster R-CNN）只在以下情况运行：
+    距上次运行已满 every_n 帧、主模型不确定的框占比过高、或主模型检测框过多（密集场景）
+    第二个模型没有运行的帧按"第二个模型无检测"参与融合，保证所有帧的分数尺度一致
+    """
+
+    def __init__(self, primary, secondary, fuse, every_n=ADAPTIVE_EVERY_N,
+                 uncertain_score=ADAPTIVE_UNCERTAIN_SCORE, uncertain_ratio=ADAPTIVE_UNCERTAIN_RATIO,
+                 dense_count=ADAPTIVE_DENSE_COUNT):
+        self.primary = primary      # (name, detect_fn)
+        self.secondary = secondary  # (name, detect_fn)
+        self.fuse = fuse
+        self.every_n = max(1, int(every_n))
+        self.uncertain_score = uncertain_score
+        self.uncertain_ratio = uncertain_ratio
+        self.dense_count = dense_count
+        self.timer = StageTimer()
+        self.frames = 0
+        self.since_fired = None
+        self.reasons = {"periodic": 0, "uncertain": 0, "dense": 0}
+
+    def _timed(self, name, detect_fn, images):
+        start = time.perf_counter()
+        detections = detect_fn(images)
+        self.timer.add(f"detect_{name}", time.perf_counter() - start, len(images))
+        return detections
+
+    def _reason(self, detections):
+        """返回需要运行第二个模型的原因，不需要时返回 None"""
+        _, scores, _ = detections
+        if self.since_fired is None or self.since_fired + 1 >= self.every_n:
+            return "periodic"
+        if len(scores) >= self.dense_count:
+            return "dense"
+        if len(scores) and np.mean(np.asarray(scores) < self.uncertain_score) > self.uncertain_ratio:
+            return "uncertain"
+        return None
+
+    def __call__(self, images):
+        start = time.perf_counter()
+        primary_detections = self._timed(*self.primary, images)
+
+        fire = []
+        for index, detections in enumerate(primary_detections):
+            reason = self._reason(detections)
+            if reason is None:
+                self.since_fired += 1
+            else:
+                self.reasons[reason] += 1
+                self.since_fired = 0
+                fire.append(index)
+            self.frames += 1
+
+        # 只把需要的帧组成一批送入第二个模型
+        empty = (np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=int))
+        secondary_detections = [empty] * len(images)
+        if fire:
+            for index, detections in zip(fire, self._timed(*self.secondary, [images[i] for i in fire])):
+                secondary_detections[index] = detections
+
+        fuse_start = time.perf_counter()
+        fused = [self.fuse(first, second, img.shape[1], img.shape[0])
+                 for img, first, second in zip(images, primary_detections, secondary_detections)]
+        self.timer.add("fuse", time.perf_counter() - fuse_start, len(images))
+        self.timer.add("ensemble", time.perf_counter() - start, len(images))
+        return fused
+
+    def stats(self):
+        """第二个模型的触发统计：总帧数、触发帧数、触发率及各触发原因的次数"""
+        fired = sum(self.reasons.values())
+        return {
+            "frames": self.frames,
+            "secondary_frames": fired,
+            "fire_rate": round(fired / self.frames, 4) if self.frames else 0.0,
+            "reasons": dict(self.reasons)
+        }
+
+    def stage_times(self):
+        return self.timer.summary()
+
+    def close(self):
+        pass
+
+
+def build_wbf_detector(yolo_conf=0.5, tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP, parallel=True,
+                       adaptive=False, every_n=ADAPTIVE_EVERY_N, quantize_faster=FASTER_QUANTIZE, roi=None,
+                       backend=YOLO_BACKEND):
+    """
+    YOLO + Faster R-CNN 并行推理后做WBF融合，tile_size 不为空时两个模型各自切片推理
+    adaptive=True 时 Faster R-CNN 只在 YOLO 不确定/场景密集/每 every_n 帧时运行
+    quantize_faster=True 时使用INT8动态量化的 Faster R-CNN（CPU）
+    roi 不为空时两个模型都只检测感兴趣区域（见 roi.with_roi）
+    backend 为YOLO的推理后端（"torch"/"onnx"/"openvino"）
+    """
+    # 获取YOLO和Faster R-CNN模型（进程内只加载一次）
+    yolo_model = get_yolo(backend=backend)
+    faster_model = get_faster_rcnn(quantize=quantize_faster)
+
+    # 禁用警告信息
+    warnings.filterwarnings("ignore")
+
+    def yolo_detect(images):
+        return detect_yolo(yolo_model, images, conf=yolo_conf)
+
+    def faster_detect(images):
+        return detect_faster(faster_model, images)
+
+    if tile_size:
+        yolo_detect = tiled(yolo_detect, tile_size=tile_size, overlap=tile_overlap)
+        faster_detect = tiled(faster_detect, tile_size=tile_size, overlap=tile_overlap)
+    yolo_detect = with_roi(yolo_detect, roi)
+    faster_detect = with_roi(faster_detect, roi)
+
+    # 融合顺序与 WBF_WEIGHTS 对应：YOLO 在前
+    if adaptive:
+        return AdaptiveEnsembleDetector(("yolo", yolo_detect), ("faster_rcnn", faster_detect), fuse_wbf,
+                                        every_n=every_n)
+    return EnsembleDetector([("yolo", yolo_detect), ("faster_rcnn", faster_detect)], fuse_wbf, parallel=parallel)
+
+
+def compare_adaptive(count_video, input_video_path, every_n_values=(5, 10, 30)):
+    """
+    对同一视频（仅计数模式）分别运行始终集成和不同 every_n 的自适应集成，
+    报告第二个模型的触发率、计数相对始终集成的偏差和速度。count_video 为 WBF 的 count_vehicles_video 函数
+    """
+    baseline = count_video(input_video_path, None, counts_only=True)
+    if baseline is None:
+        return None
+    baseline_total = baseline["total_in"] + baseline["total_out"]
+    report = []
+    for every_n in every_n_values:
+        result = count_video(input_video_path, None, counts_only=True, adaptive=True, every_n=every_n)
+        row = {
+            "every_n": every_n,
+            "total_in": result["total_in"],
+            "total_out": result["total_out"],
+            "drift_in": result["total_in"] - baseline["total_in"],
+            "drift_out": result["total_out"] - baseline["total_out"],
+            "fire_rate": result["ensemble"]["fire_rate"],
+            "speedup": round(result["fps"] / baseline["fps"], 2) if baseline["fps"] else 0.0
+        }
+        drift_total = abs(row["drift_in"]) + abs(row["drift_out"])
+        row["drift_ratio"] = round(drift_total / baseline_total, 4) if baseline_total else 0.0
+        report.append(row)
+        print(f"every_n={every_n}: 触发率 {row['fire_rate']:.1%}, 入场 {row['total_in']} ({row['drift_in']:+d}), "
+              f"出场 {row['total_out']} ({row['drift_out']:+d}), 偏差 {row['drift_ratio']:.2%}, "
+              f"加速 {row['speedup']}x")
+    return report
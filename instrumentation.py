@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 默认导出路径及实时FPS的统计窗口（秒）
+METRICS_PATH = "./output/metrics.json"
+FPS_WINDOW = 2.0
+
+
+class _NullTimer:
+    """关闭时使用的空计时器"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.owner.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class ProfileWindow:
+    """
+    在第 start_frame 帧到第 start_frame + frames 帧之间采集性能剖析：
+    kind="cprofile" 保存为 .prof（可用 snakeviz 查看），kind="torch" 保存为 Chrome trace JSON
+    cProfile 只采集调用 step() 的线程（检测/跟踪所在的主循环）
+    """
+
+    def __init__(self, start_frame=100, frames=50, kind="cprofile", output_path=None):
+        if kind not in ("cprofile", "torch"):
+            raise ValueError(f"不支持的性能剖析方式: {kind}")
+        self.start_frame = start_frame
+        self.end_frame = start_frame + frames
+        self.kind = kind
+        self.output_path = output_path or f"./output/profile.{'prof' if kind == 'cprofile' else 'json'}"
+        self.profiler = None
+        self.done = False
+
+    def _start(self):
+        if self.kind == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            import torch.profiler
+            self.profiler = torch.profiler.profile(record_shapes=True)
+            self.profiler.start()
+
+    def stop(self):
+        if self.profiler is None or self.done:
+            return
+        self.done = True
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        if self.kind == "cprofile":
+            self.profiler.disable()
+            self.profiler.dump_stats(self.output_path)
+        else:
+            self.profiler.stop()
+            self.profiler.export_chrome_trace(self.output_path)
+        print(f"性能剖析结果保存至: {self.output_path}")
+
+    def step(self, frame_index):
+        if self.done:
+            return
+        if self.profiler is None and frame_index >= self.start_frame:
+            self._start()
+        elif self.profiler is not None and frame_index >= self.end_frame:
+            self.stop()
+
+
+class Instrumentation:
+    """
+    命名计时器和计数器：关闭时 timer() 返回空计时器、add_time()/count() 直接返回，开销可以忽略
+    开启后累计各阶段耗时，按处理帧数计算实时FPS，并可导出到本地指标文件
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.metrics_path = None
+        self.profile_window = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}     # {name: [总耗时, 次数, 最大耗时]}
+            self.counters = {}
+            self.frames = 0
+            self._frame_marks = deque()  # (时间, 累计帧数)
+            self.started = time.time()
+
+    def enable(self, metrics_path=None, profile_window=None):
+        """开启统计，metrics_path 不为空时 flush() 导出到该文件，profile_window 为 ProfileWindow"""
+        self.reset()
+        self.metrics_path = metrics_path
+        self.profile_window = profile_window
+        self.enabled = True
+
+    def disable(self):
+        if self.profile_window is not None:
+            self.profile_window.stop()
+        self.enabled = False
+
+    def timer(self, name):
+        """with instrumentation.timer("stage"): ... 统计代码块耗时"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds, count=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self.timers.get(name)
+            if entry is None:
+                self.timers[name] = [seconds, count, seconds / max(count, 1)]
+            else:
+                entry[0] += seconds
+                entry[1] += count
+                entry[2] = max(entry[2], seconds / max(count, 1))
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def frame_done(self, count=1):
+        """处理完 count 帧时调用：更新实时FPS，并推进性能剖析窗口"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            self.frames += count
+            self._frame_marks.append((now, self.frames))
+            while len(self._frame_marks) > 2 and now - self._frame_marks[0][0] > FPS_WINDOW:
+                self._frame_marks.popleft()
+        if self.profile_window is not None:
+            self.profile_window.step(self.frames)
+
+    def live_fps(self):
+        """最近 FPS_WINDOW 秒内的处理速度（帧/秒），最近没有帧完成时为 0"""
+        with self._lock:
+            if len(self._frame_marks) < 2 or time.perf_counter() - self._frame_marks[-1][0] > FPS_WINDOW:
+                return 0.0
+            (start, first), (end, last) = self._frame_marks[0], self._frame_marks[-1]
+        return (last - first) / (end - start) if end > start else 0.0
+
+    def summary(self):
+        """返回 {"timers": {name: {total_s, count, ms_avg, ms_max}}, "counters", "frames", "fps"}"""
+        with self._lock:
+            timers = {
+                name: {
+                    "total_s": round(total, 4),
+                    "count": count,
+                    "ms_avg": round(total * 1000 / max(count, 1), 3),
+                    "ms_max": round(longest * 1000, 3)
+                }
+                for name, (total, count, longest) in self.timers.items()
+            }
+            counters = dict(self.counters)
+            frames = self.frames
+        return {"timers": timers, "counters": counters, "frames": frames, "live_fps": round(self.live_fps(), 2)}
+
+    def export(self, path=None):
+        """把当前统计写入JSON指标文件，返回文件路径"""
+        path = path or self.metrics_path or METRICS_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = self.summary()
+        data["started"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started))
+        data["exported"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    def flush(self):
+        """一次处理结束时调用：开启统计且指定了 metrics_path 时导出"""
+        if self.profile_window is not None:
+            self.profile_window.stop()
+        if self.enabled and self.metrics_path:
+            print(f"性能指标保存至: {self.export()}")
+
+
+# 进程内共享的默认实例
+instrumentation = Instrumentation()
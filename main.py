@@ -1,10 +1,13 @@
 import subprocess
 import cv2
-from process_picture_with_YOLO import count_vehicles_picture
+from process_picture_with_YOLO import count_vehicles_picture, count_vehicles_pictures
 from process_video_with_YOLO import count_vehicles_video
+from model_registry import warm_up, unload
+from batch_engine import process_videos_parallel
+from instrumentation import instrumentation
 import os
 import sqlite3
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout,
@@ -302,7 +305,8 @@ class MainWindow(QMainWindow):
         # Get video history
         video_dir = os.path.join("user_data", self.username, "videos")
         for f in os.listdir(video_dir):
-            if "_result" in f:
+            # Skip checkpoint directories (<name>_result.ext.<detector>.parts) left by resumable processing
+            if "_result" in f and not f.endswith(".parts"):
                 item = QListWidgetItem(f"🎥 {f}")
                 item.file_path = os.path.join(video_dir, f)
                 self.history_list.addItem(item)
@@ -324,6 +328,8 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "File does not exist!")
 
     def logout(self):
+        # Release cached detectors
+        unload()
         self.close()
         self.login_window = LoginWindow()
         self.login_window.show()
@@ -385,6 +391,8 @@ class MainWindow(QMainWindow):
             base_name, ext = os.path.splitext(os.path.basename(file_path))
             output_path = os.path.join(user_dir, f"{base_name}_result{ext}")
 
+            # Stage timers feed the live FPS shown in the progress dialog
+            instrumentation.enable()
             self.progress_dialog = ProgressDialog(0, self)
             self.progress_dialog.show()
 
@@ -441,6 +449,7 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Complete", "Video processing completed")
         else:
             QMessageBox.critical(self, "Error", "Video processing failed")
+        instrumentation.disable()
         if hasattr(self, 'progress_dialog'):
             self.progress_dialog.close()
 
@@ -484,7 +493,10 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Error", "Video processing failed")
 
     def cancel_batch_processing(self):
-        if hasattr(self, 'batch_worker'):
+        if self.current_page == "Videos" and hasattr(self, 'video_batch_worker'):
+            self.video_batch_worker.stop()
+            QMessageBox.warning(self, "Cancelled", "Processing cancelled")
+        elif hasattr(self, 'batch_worker'):
             self.batch_worker.stop()
             QMessageBox.warning(self, "Cancelled", "Processing cancelled")
 
@@ -518,12 +530,23 @@ class ProgressDialog(QDialog):
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.status_label)
 
+        # Live FPS from the instrumentation counters (only shown while frames are being processed in this process)
+        self.fps_label = QLabel("", self)
+        layout.addWidget(self.fps_label)
+        self.fps_timer = QTimer(self)
+        self.fps_timer.timeout.connect(self.update_fps)
+        self.fps_timer.start(500)
+
         self.cancel_button = QPushButton("Cancel", self)
         self.cancel_button.clicked.connect(self.reject)
         layout.addWidget(self.cancel_button)
 
         self.setLayout(layout)
 
+    def update_fps(self):
+        fps = instrumentation.live_fps() if instrumentation.enabled else 0.0
+        self.fps_label.setText(f"FPS: {fps:.1f} ({instrumentation.frames} frames)" if fps > 0 else "")
+
     def update_progress(self, current, filename):
         if self.progress_bar.maximum() == 0:
             return
@@ -542,18 +565,23 @@ class BatchWorker(QThread):
         self._is_running = True
 
     def run(self):
+        output_paths = []
+        for file_path in self.file_paths:
+            base_name, ext = os.path.splitext(os.path.basename(file_path))
+            output_paths.append(os.path.join(self.output_dir, f"{base_name}_result{ext}"))
+
+        # Images are decoded once, inferred in mini-batches and written in the background
         processed_files = []
-        for i, file_path in enumerate(self.file_paths):
-            if not self._is_running:
-                break
-            try:
-                base_name, ext = os.path.splitext(os.path.basename(file_path))
-                output_path = os.path.join(self.output_dir, f"{base_name}_result{ext}")
-                count_vehicles_picture(file_path, output_path)
-                processed_files.append(output_path)
-                self.progress_update.emit(i + 1, os.path.basename(file_path))
-            except Exception as e:
-                print(f"Processing failed: {file_path} - {str(e)}")
+        try:
+            totals = count_vehicles_pictures(
+                self.file_paths, output_paths,
+                on_progress=lambda done, file_path, total: self.progress_update.emit(
+                    done, os.path.basename(file_path)),
+                should_stop=lambda: not self._is_running
+            )
+            processed_files = [output_path for output_path, total in zip(output_paths, totals) if total is not None]
+        except Exception as e:
+            print(f"Processing failed: {str(e)}")
         self.finished_signal.emit(processed_files)
 
     def stop(self):
@@ -570,6 +598,7 @@ class SingleVideoWorker(QThread):
 
     def run(self):
         try:
+            warm_up()
             count_vehicles_video(self.file_path, self.output_path)
             self.finished_signal.emit(self.output_path)
         except Exception as e:
@@ -581,30 +610,36 @@ class VideoBatchWorker(QThread):
     progress_update = pyqtSignal(int, str)
     finished_signal = pyqtSignal(list)
 
-    def __init__(self, file_paths, output_dir):
+    def __init__(self, file_paths, output_dir, resumable=False):
         super().__init__()
         self.file_paths = file_paths
         self.output_dir = output_dir
+        # Checkpoint each video so re-running a cancelled or crashed batch resumes where it stopped.
+        # Needs ffmpeg (or imageio-ffmpeg/PyAV) to join the segments of videos longer than one segment
+        self.resumable = resumable
         self._is_running = True
 
     def run(self):
-        processed_files = []
-        for i, file_path in enumerate(self.file_paths):
-            if not self._is_running:
-                break
-            try:
-                base_name, ext = os.path.splitext(os.path.basename(file_path))
-                output_path = os.path.join(self.output_dir, f"{base_name}_result{ext}")
-
-                self.progress_update.emit(i + 1, os.path.basename(file_path))
-
-                count_vehicles_video(file_path, output_path)
-                processed_files.append(output_path)
+        jobs = []
+        for file_path in self.file_paths:
+            base_name, ext = os.path.splitext(os.path.basename(file_path))
+            jobs.append((file_path, os.path.join(self.output_dir, f"{base_name}_result{ext}")))
 
-            except Exception as e:
-                print(f"Processing failed: {file_path} - {str(e)}")
+        # Videos are spread across worker processes, each with its own preloaded models
+        processed_files = []
+        try:
+            results = process_videos_parallel(jobs, detector="YOLO", on_result=self.on_result,
+                                              should_stop=lambda: not self._is_running, resumable=self.resumable)
+            processed_files = [output_path for _, output_path, _, error in results if error is None]
+        except Exception as e:
+            print(f"Batch processing failed: {str(e)}")
         self.finished_signal.emit(processed_files)
 
+    def on_result(self, done, total, input_path, output_path, result, error):
+        if error is not None:
+            print(f"Processing failed: {input_path} - {error}")
+        self.progress_update.emit(done, os.path.basename(input_path))
+
     def stop(self):
         self._is_running = False
 
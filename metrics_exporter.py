@@ -0,0 +1,130 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认监听地址和端口（只监听本机，需要远程抓取时改为 "0.0.0.0"）
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+METRICS_PREFIX = "vehicle_counting"
+
+# 指标名称 -> (类型, 说明)
+_METRICS = {
+    "frames_processed": ("counter", "Frames processed by the counting loop"),
+    "frames_dropped": ("counter", "Frames dropped to stay within the latency budget"),
+    "vehicles_in": ("counter", "Vehicles counted crossing the line downwards"),
+    "vehicles_out": ("counter", "Vehicles counted crossing the line upwards"),
+    "fps": ("gauge", "Processing speed since the first update (frames per second)"),
+    "frame_queue_depth": ("gauge", "Frames waiting in the decode/capture queue"),
+    "encode_queue_depth": ("gauge", "Frames waiting in the draw/encode queue"),
+    "active_tracks": ("gauge", "Tracks currently held by the line counter"),
+    "up": ("gauge", "1 while a counting job is running")
+}
+
+
+class MetricsExporter:
+    """
+    内嵌的 Prometheus 指标端点：后台线程提供 GET /metrics（文本格式），计数循环只调用 update() 替换快照，
+    不加锁也不等待网络，抓取请求不会阻塞推理
+    """
+
+    def __init__(self, port=METRICS_PORT, host=METRICS_HOST, labels=None):
+        self.port = port
+        self.host = host
+        self.labels = dict(labels or {})  # 附加到所有指标上的标签，如 {"source": "cam1"}
+        self.values = {"up": 0}
+        self.per_class = {}
+        self.started = None
+        self._first_frames = None  # 第一次更新时的帧数（从检查点续接时不从 0 开始）
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # port=0 时使用系统分配的端口
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics")
+        self._thread.start()
+        self.started = time.perf_counter()
+        self.values = {"up": 1}
+        print(f"指标端点: http://{self.host}:{self.port}/metrics")
+        return self
+
+    def update(self, per_class=None, **values):
+        """更新指标快照（整体替换字典，读取线程总能拿到一致的一组数值）"""
+        snapshot = dict(self.values)
+        snapshot.update(values)
+        if "frames_processed" in values and self.started is not None:
+            if self._first_frames is None:
+                self._first_frames = values["frames_processed"]
+                self.started = time.perf_counter()
+            elapsed = time.perf_counter() - self.started
+            frames = values["frames_processed"] - self._first_frames
+            snapshot["fps"] = round(frames / elapsed, 2) if elapsed > 0 else 0.0
+        self.values = snapshot
+        if per_class is not None:
+            self.per_class = {name: dict(counts) for name, counts in per_class.items()}
+
+    def _label_text(self, extra=None):
+        labels = dict(self.labels, **(extra or {}))
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+    def render(self):
+        """按 Prometheus 文本格式输出当前快照"""
+        values, per_class = self.values, self.per_class
+        lines = []
+        for name, (kind, help_text) in _METRICS.items():
+            if name not in values:
+                continue
+            metric = f"{METRICS_PREFIX}_{name}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric}{self._label_text()} {values[name]}")
+        if per_class:
+            metric = f"{METRICS_PREFIX}_class_vehicles_total"
+            lines.append(f"# HELP {metric} Vehicles counted per class and direction")
+            lines.append(f"# TYPE {metric} counter")
+            for class_name, counts in sorted(per_class.items()):
+                for direction, count in sorted(counts.items()):
+                    lines.append(f"{metric}{self._label_text({'class': class_name, 'direction': direction})} {count}")
+        return "\n".join(lines) + "\n"
+
+    def stop(self):
+        """任务结束：up 置 0 后关闭端点"""
+        self.update(up=0)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+@contextmanager
+def serve_metrics(port=None, host=METRICS_HOST):
+    """port 为 None 时不启动端点（返回 None），否则在任务期间提供 /metrics，结束后关闭"""
+    if port is None:
+        yield None
+        return
+    exporter = MetricsExporter(port, host).start()
+    try:
+        yield exporter
+    finally:
+        exporter.stop()
@@ -0,0 +1,155 @@
+import os
+import threading
+import weakref
+
+import numpy as np
+
+# 默认模型权重路径
+YOLO_WEIGHTS = "YOLO_VisDrone.pt"
+# YOLO推理后端："torch" 为 PyTorch 原生推理，其余为导出后的格式 -> 导出文件相对权重文件的后缀
+YOLO_BACKEND = "torch"
+YOLO_EXPORT_SUFFIXES = {
+    "onnx": ".onnx",                  # ONNX Runtime CPU
+    "openvino": "_openvino_model",    # OpenVINO
+}
+YOLO_EXPORT_IMGSZ = 640
+FASTER_CONFIG = "COCO-Detection/faster_rcnn_R_50_FPN_3x.yaml"
+FASTER_WEIGHTS = "./model_final_280758.pkl"
+FASTER_NUM_CLASSES = 8
+FASTER_SCORE_THRESH = 0.8
+# Faster R-CNN 默认不量化；量化模型只能在CPU上运行
+FASTER_QUANTIZE = False
+
+# 进程级模型缓存 {key: model}，key 由权重路径和配置组成
+_models = {}
+# 每个 key 一把锁，保证同一模型只加载一次
+_key_locks = {}
+_registry_lock = threading.Lock()
+# 每个模型一把推理锁：Ultralytics 的 predictor 不是线程安全的，多个线程共享同一模型时推理必须串行
+_inference_locks = weakref.WeakKeyDictionary()
+
+
+def _key_lock(key):
+    with _registry_lock:
+        if key not in _key_locks:
+            _key_locks[key] = threading.Lock()
+        return _key_locks[key]
+
+
+def _get_or_load(key, loader):
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _key_lock(key):
+        # 双重检查，其他线程可能已经加载完成
+        model = _models.get(key)
+        if model is None:
+            model = loader()
+            _models[key] = model
+    return model
+
+
+def inference_lock(model):
+    """返回模型的推理锁，推理时 with inference_lock(model): ..."""
+    with _registry_lock:
+        lock = _inference_locks.get(model)
+        if lock is None:
+            lock = threading.Lock()
+            _inference_locks[model] = lock
+        return lock
+
+
+def export_yolo(weights=YOLO_WEIGHTS, backend="onnx", imgsz=YOLO_EXPORT_IMGSZ):
+    """
+    把 .pt 权重导出为 backend 格式并缓存在权重文件旁边（如 YOLO_VisDrone.onnx），
+    已导出且不早于权重文件时直接返回缓存路径，不重复导出
+    进程内按导出路径加锁；多进程处理时由父进程在启动工作进程前导出（见 batch_engine.prepare_models）
+    """
+    if backend not in YOLO_EXPORT_SUFFIXES:
+        raise ValueError(f"不支持的YOLO后端: {backend}，可选: torch, {', '.join(YOLO_EXPORT_SUFFIXES)}")
+    exported = os.path.splitext(weights)[0] + YOLO_EXPORT_SUFFIXES[backend]
+    with _key_lock(("export", exported)):
+        if os.path.exists(exported) and os.path.getmtime(exported) >= os.path.getmtime(weights):
+            return exported
+
+        from ultralytics import YOLO
+        print(f"导出YOLO模型: {weights} -> {exported}")
+        # 动态输入尺寸，支持批量推理和切片推理的不同输入大小
+        return YOLO(weights).export(format=backend, imgsz=imgsz, dynamic=True, verbose=False)
+
+
+def get_yolo(weights=YOLO_WEIGHTS, backend=YOLO_BACKEND):
+    """
+    获取YOLO模型（首次调用时加载）
+    backend 不为 "torch" 时加载导出后的模型，predict 接口和返回结果与 PyTorch 模型一致
+    """
+    def load():
+        from ultralytics import YOLO
+        if backend == "torch":
+            return YOLO(weights)
+        return YOLO(export_yolo(weights, backend), task="detect")
+
+    return _get_or_load(("yolo", weights, backend), load)
+
+
+def quantize_faster_rcnn(predictor):
+    """
+    动态INT8量化：ROI box head 的全连接层（fc1/fc2）和分类/回归层的权重转为INT8，
+    激活值在推理时动态量化。卷积主干保持FP32，量化后的模型只能在CPU上运行
+    """
+    import torch
+
+    predictor.model = torch.ao.quantization.quantize_dynamic(predictor.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return predictor
+
+
+def get_faster_rcnn(weights=FASTER_WEIGHTS, config_file=FASTER_CONFIG,
+                    num_classes=FASTER_NUM_CLASSES, score_thresh=FASTER_SCORE_THRESH, quantize=FASTER_QUANTIZE):
+    """获取Faster R-CNN预测器（首次调用时加载），quantize=True 时返回CPU上的INT8动态量化版本"""
+    def load():
+        from detectron2.config import get_cfg
+        from detectron2.engine import DefaultPredictor
+        from detectron2.model_zoo import model_zoo
+
+        faster_cfg = get_cfg()
+        faster_cfg.merge_from_file(model_zoo.get_config_file(config_file))
+        faster_cfg.MODEL.WEIGHTS = weights
+        faster_cfg.MODEL.ROI_HEADS.NUM_CLASSES = num_classes
+        faster_cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = score_thresh
+        if not quantize:
+            return DefaultPredictor(faster_cfg)
+        faster_cfg.MODEL.DEVICE = "cpu"
+        return quantize_faster_rcnn(DefaultPredictor(faster_cfg))
+
+    return _get_or_load(("faster_rcnn", weights, config_file, num_classes, score_thresh, quantize), load)
+
+
+def warm_up(use_faster=False, image_size=(640, 640), yolo_backend=YOLO_BACKEND, quantize_faster=FASTER_QUANTIZE):
+    """预先加载模型并执行一次空推理，避免首帧延迟"""
+    dummy = np.zeros((image_size[1], image_size[0], 3), dtype=np.uint8)
+    yolo_model = get_yolo(backend=yolo_backend)
+    with inference_lock(yolo_model):
+        yolo_model.predict(dummy, verbose=False)
+    if use_faster:
+        faster_model = get_faster_rcnn(quantize=quantize_faster)
+        with inference_lock(faster_model):
+            faster_model(dummy)
+
+
+def loaded_models():
+    """返回当前已加载的模型 key 列表"""
+    return list(_models.keys())
+
+
+def unload(kind=None):
+    """卸载模型，kind 为 "yolo"/"faster_rcnn" 或 None（全部卸载）"""
+    with _registry_lock:
+        for key in list(_models.keys()):
+            if kind is None or key[0] == kind:
+                del _models[key]
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
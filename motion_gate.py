@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+from roi import resolve_roi
+
+# 运动检测默认参数
+MOTION_THRESHOLD = 0.002    # 变化像素占比超过该值视为有运动
+MOTION_PIXEL_DIFF = 25      # 帧差法中灰度变化超过该值的像素视为变化
+MOTION_WIDTH = 160          # 运动检测前把画面缩小到的宽度
+MOTION_MAX_SKIP = 30        # 连续跳过检测的最大帧数，防止静止车辆的轨迹过期
+
+
+class MotionGate:
+    """
+    低成本的运动检测门控：在缩小的灰度图上做帧差（method="diff"）或背景建模（method="mog2"），
+    画面静止时跳过检测，由跟踪器的运动模型推进轨迹
+    roi 与 roi.with_roi 的参数相同，指定时只检测该区域内的运动
+    """
+
+    def __init__(self, threshold=MOTION_THRESHOLD, method="diff", roi=None, pixel_diff=MOTION_PIXEL_DIFF,
+                 width=MOTION_WIDTH, max_skip=MOTION_MAX_SKIP):
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"不支持的运动检测方法: {method}")
+        self.threshold = threshold
+        self.method = method
+        self.roi = roi
+        self.pixel_diff = pixel_diff
+        self.width = width
+        self.max_skip = max_skip
+        self.previous = None
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == "mog2" else None
+        self.region = None
+        self.since_detect = 0
+        self.checked = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        """裁剪感兴趣区域、转灰度、缩小并平滑"""
+        if self.region is None:
+            height, width = frame.shape[:2]
+            self.region = resolve_roi(self.roi, height, width)[0] if self.roi is not None else (0, 0, width, height)
+        x1, y1, x2, y2 = self.region
+        gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, self.width / gray.shape[1])
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def motion(self, frame):
+        """返回画面中变化像素的占比"""
+        small = self._prepare(frame)
+        if self.subtractor is not None:
+            return float(np.count_nonzero(self.subtractor.apply(small))) / small.size
+        previous, self.previous = self.previous, small
+        if previous is None:
+            return 1.0
+        return float(np.count_nonzero(cv2.absdiff(small, previous) > self.pixel_diff)) / small.size
+
+    def should_detect(self, frame):
+        """有运动（或已连续跳过 max_skip 帧）时返回 True"""
+        self.checked += 1
+        self.since_detect += 1
+        if self.motion(frame) >= self.threshold or self.since_detect > self.max_skip:
+            self.since_detect = 0
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {
+            "method": self.method,
+            "threshold": self.threshold,
+            "frames_checked": self.checked,
+            "frames_skipped": self.skipped,
+            "skip_fraction": round(self.skipped / self.checked, 4) if self.checked else 0.0
+        }
@@ -1,78 +1,27 @@
-import warnings
-
 import cv2
-from detectron2.model_zoo import model_zoo
-from ensemble_boxes import weighted_boxes_fusion
-from ultralytics import YOLO
-from detectron2.engine import DefaultPredictor
-from detectron2.config import get_cfg
-
 
-def count_vehicles_picture(input_path, output_path):
-    # 加载YOLO模型
-    yolo_model = YOLO("YOLO_VisDrone.pt")
+from ensemble import build_wbf_detector
+from model_registry import FASTER_QUANTIZE, YOLO_BACKEND
+from tiling import DEFAULT_TILE_OVERLAP
 
-    # 加载Faster R-CNN模型
-    faster_cfg = get_cfg()
-    faster_cfg.merge_from_file(model_zoo.get_config_file("COCO-Detection/faster_rcnn_R_50_FPN_3x.yaml"))
-    faster_cfg.MODEL.WEIGHTS = "./model_final_280758.pkl"
-    faster_cfg.MODEL.ROI_HEADS.NUM_CLASSES = 8
-    faster_cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.8
-    faster_model = DefaultPredictor(faster_cfg)
 
+def count_vehicles_picture(input_path, output_path, tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP,
+                           quantize_faster=FASTER_QUANTIZE, backend=YOLO_BACKEND):
     # 读取图像
     img = cv2.imread(input_path)
-    height, width = img.shape[:2]
-
-    # 禁用警告信息
-    warnings.filterwarnings("ignore")
-
-    # YOLO推理
-    yolo_results = yolo_model.predict(img, conf=0.5)
-    yolo_boxes = []
-    yolo_scores = []
-    yolo_labels = []
-    for box in yolo_results[0].boxes:
-        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-        conf = box.conf.item()
-        cls = int(box.cls.item())
-        yolo_boxes.append([x1 / width, y1 / height, x2 / width, y2 / height])
-        yolo_scores.append(conf)
-        yolo_labels.append(cls)
-
-    # Faster R-CNN推理
-    faster_output = faster_model(img)
-    faster_boxes = []
-    faster_scores = []
-    faster_labels = []
-    for box, score, cls in zip(faster_output["instances"].pred_boxes,
-                               faster_output["instances"].scores,
-                               faster_output["instances"].pred_classes):
-        x1, y1, x2, y2 = box.cpu().numpy()
-        faster_boxes.append([x1 / width, y1 / height, x2 / width, y2 / height])
-        faster_scores.append(score.item())
-        faster_labels.append(cls.item())
-
-    # WBF融合
-    boxes_list = [yolo_boxes, faster_boxes]
-    scores_list = [yolo_scores, faster_scores]
-    labels_list = [yolo_labels, faster_labels]
-    weights = [2, 1]  # 给YOLO更高的权重
-
-    fused_boxes, _, _ = weighted_boxes_fusion(
-        boxes_list,
-        scores_list,
-        labels_list,
-        weights=weights,
-        iou_thr=0.5,
-        skip_box_thr=0.4
-    )
-
-    # 转换回绝对坐标
-    fused_boxes[:, 0] *= width
-    fused_boxes[:, 1] *= height
-    fused_boxes[:, 2] *= width
-    fused_boxes[:, 3] *= height
+    if img is None:
+        print(f"无法加载图片: {input_path}")
+        return
+
+    # YOLO 和 Faster R-CNN 同时推理后做WBF融合（给YOLO更高的权重），返回绝对坐标
+    # 高分辨率图片可切片推理，两个模型各自合并切片结果后再融合
+    # quantize_faster=True 时 Faster R-CNN 使用INT8动态量化（CPU），backend 为YOLO的推理后端
+    detector = build_wbf_detector(yolo_conf=0.5, tile_size=tile_size, tile_overlap=tile_overlap,
+                                  quantize_faster=quantize_faster, backend=backend)
+    try:
+        fused_boxes, _, _ = detector([img])[0]
+    finally:
+        detector.close()
 
     # 可视化和保存
     vehicle_classes = [
@@ -90,6 +39,7 @@ def count_vehicles_picture(input_path, output_path):
     cv2.imwrite(output_path, img)
     print(f"结果保存至 {output_path}")
     print("总车辆数量:", total)
+    return total
 
 
 if __name__ == "__main__":
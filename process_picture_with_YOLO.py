@@ -1,55 +1,49 @@
-from ultralytics import YOLO
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 
+from detectors import detect_yolo
+from model_registry import YOLO_BACKEND, get_yolo
+from tiling import DEFAULT_TILE_OVERLAP, tiled
 
-def count_vehicles_picture(input_path,  output_path):
-    # 加载模型
-    model = YOLO("YOLO_VisDrone.pt")
+VEHICLE_CLASS_NAMES = [
+    "bicycle", "car", "van", "truck", "tricycle",
+    "awning-tricycle", "bus", "motor"
+]
 
-    # 推理
-    results = model.predict(input_path, conf=0.5)
-
-    # 获取类别名称映射（从模型直接读取）
-    class_names = results[0].names
 
+def get_vehicle_classes(class_names):
     # 定义需要统计的车辆类别（动态获取类别名称）
-    vehicle_classes = {
+    return {
         class_id: class_name for class_id, class_name in class_names.items()
-        if class_name.lower() in [
-            "bicycle", "car", "van", "truck", "tricycle",
-            "awning-tricycle", "bus", "motor"
-        ]
+        if class_name.lower() in VEHICLE_CLASS_NAMES
     }
 
-    # 初始化计数器
-    count_dict = {name: 0 for name in vehicle_classes.values()}
-    total = 0
 
-    # 统计检测结果
-    boxes = results[0].boxes
-    class_ids = boxes.cls.cpu().numpy().astype(int)
+def build_detector(model, tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP):
+    """构建批量检测函数，tile_size 不为空时对高分辨率图片做切片推理"""
+    def detect_batch(images):
+        return detect_yolo(model, images, conf=0.5)
 
-    for class_id in class_ids:
-        if class_id in vehicle_classes:
-            class_name = vehicle_classes[class_id]
-            count_dict[class_name] += 1
-            total += 1
+    if tile_size:
+        detect_batch = tiled(detect_batch, tile_size=tile_size, overlap=tile_overlap)
+    return detect_batch
 
-    # 绘制检测框和计数
-    img = cv2.imread(input_path)
-    if img is None:
-        print(f"无法加载图片: {input_path}")
-        return
+
+def annotate_and_save(img, detections, vehicle_classes, output_path):
+    """统计车辆数、绘制检测框并保存，返回车辆总数"""
+    boxes, _, class_ids = detections
+    xyxy = boxes.astype(int)
 
     # 统一框的颜色为绿色
     default_color = (0, 255, 0)  # 绿色
 
-    # 绘制每个检测框
-    for box, class_id in zip(boxes, class_ids):
+    # 统计并绘制每个检测框
+    total = 0
+    for (x1, y1, x2, y2), class_id in zip(xyxy, class_ids):
         if class_id in vehicle_classes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-            color = default_color  # 使用统一的绿色框
-            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
+            total += 1
+            cv2.rectangle(img, (x1, y1), (x2, y2), default_color, 2)
 
     # 在左上角显示统计信息
     y_offset = 30
@@ -58,8 +52,111 @@ def count_vehicles_picture(input_path,  output_path):
 
     # 保存结果
     cv2.imwrite(output_path, img)
+    return total
+
+
+def count_vehicles_picture(input_path,  output_path, tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP,
+                           backend=YOLO_BACKEND):
+    # 获取模型（进程内只加载一次），backend 可选 "torch"/"onnx"/"openvino"
+    model = get_yolo(backend=backend)
+    detect_batch = build_detector(model, tile_size, tile_overlap)
+
+    # 读取图片（只解码一次，推理和绘制共用）
+    img = cv2.imread(input_path)
+    if img is None:
+        print(f"无法加载图片: {input_path}")
+        return
+
+    # 推理
+    detections = detect_batch([img])[0]
+
+    # 获取类别名称映射（从模型直接读取）
+    vehicle_classes = get_vehicle_classes(model.names)
+
+    total = annotate_and_save(img, detections, vehicle_classes, output_path)
     print(f"结果保存至 {output_path}")
     print("总车辆数量:", total)
+    return total
+
+
+def count_vehicles_pictures(input_paths, output_paths, batch_size=8, num_writers=2, on_progress=None,
+                            should_stop=None, tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP,
+                            backend=YOLO_BACKEND):
+    """
+    批量处理图片：每张图片只解码一次，按 batch_size 合并推理，绘制和保存在后台线程池完成
+    on_progress(done, input_path, total): 每张图片处理完成后回调
+    should_stop(): 返回 True 时停止处理后续批次
+    返回与输入顺序一致的车辆总数列表（失败的图片为 None）
+    """
+    model = get_yolo(backend=backend)
+    detect_batch = build_detector(model, tile_size, tile_overlap)
+    vehicle_classes = get_vehicle_classes(model.names)
+    totals = [None] * len(input_paths)
+    batch_size = max(1, int(batch_size))
+    pending = []  # 尚未写完的 (index, future)
+    done = 0
+
+    def finish(index):
+        nonlocal done
+        done += 1
+        if on_progress is not None:
+            on_progress(done, input_paths[index], totals[index])
+
+    def collect(wait):
+        # 收集已完成（或全部）的写入任务
+        remaining = []
+        for index, future in pending:
+            if wait or future.done():
+                try:
+                    totals[index] = future.result()
+                except Exception as e:
+                    print(f"保存失败: {output_paths[index]} - {str(e)}")
+                finish(index)
+            else:
+                remaining.append((index, future))
+        pending[:] = remaining
+
+    def read_batch(start):
+        return [cv2.imread(path) for path in input_paths[start:start + batch_size]]
+
+    # 单独的读取线程预读下一批图片，与当前批次的推理重叠
+    with ThreadPoolExecutor(max_workers=1) as reader, \
+            ThreadPoolExecutor(max_workers=max(1, num_writers)) as writers:
+        next_batch = reader.submit(read_batch, 0)
+        for start in range(0, len(input_paths), batch_size):
+            images = next_batch.result()
+            if should_stop is not None and should_stop():
+                break
+            if start + batch_size < len(input_paths):
+                next_batch = reader.submit(read_batch, start + batch_size)
+
+            batch = []
+            for index, img in enumerate(images, start):
+                if img is None:
+                    print(f"无法加载图片: {input_paths[index]}")
+                    finish(index)
+                else:
+                    batch.append((index, img))
+
+            if batch:
+                # 一次前向传播处理整批图片，失败时只跳过这一批，继续处理后续批次
+                try:
+                    results = detect_batch([img for _, img in batch])
+                except Exception as e:
+                    for index, _ in batch:
+                        print(f"检测失败: {input_paths[index]} - {str(e)}")
+                        finish(index)
+                    batch, results = [], []
+
+                # 绘制和保存交给后台线程，不阻塞下一批推理
+                for (index, img), detections in zip(batch, results):
+                    pending.append((index, writers.submit(annotate_and_save, img, detections, vehicle_classes,
+                                                          output_paths[index])))
+            collect(wait=False)
+        collect(wait=True)
+
+    print(f"批量处理完成 | 成功 {sum(total is not None for total in totals)}/{len(input_paths)} 张")
+    return totals
 
 
 if __name__ == "__main__":
@@ -1,189 +1,81 @@
-import warnings
-
-from ultralytics import YOLO
-import cv2
-from tqdm import tqdm
-from detectron2.model_zoo import model_zoo
-from ensemble_boxes import weighted_boxes_fusion
-from detectron2.engine import DefaultPredictor
-from detectron2.config import get_cfg
-import numpy as np
-
-
-def count_vehicles_video(input_video_path, output_video_path):
-    # 加载YOLO模型
-    yolo_model = YOLO("YOLO_VisDrone.pt")
-
-    # 加载Faster R-CNN模型
-    faster_cfg = get_cfg()
-    faster_cfg.merge_from_file(model_zoo.get_config_file("COCO-Detection/faster_rcnn_R_50_FPN_3x.yaml"))
-    faster_cfg.MODEL.WEIGHTS = "./model_final_280758.pkl"
-    faster_cfg.MODEL.ROI_HEADS.NUM_CLASSES = 8
-    faster_cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.8
-    faster_model = DefaultPredictor(faster_cfg)
-
-    # 视频输入输出设置
-    cap = cv2.VideoCapture(input_video_path)
-    if not cap.isOpened():
-        print(f"无法打开视频文件: {input_video_path}")
-        return
-
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-    # 初始化视频写入器
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video_path, fourcc, fps, (frame_width, frame_height))
-
-    # 初始化跟踪相关变量
-    tracked_vehicles = {}
-    total_in = 0
-    total_out = 0
-    baseline_y = frame_height // 2
-
-    # 跟踪器配置
-    tracker_config = {
-        "persist": True,
-        "tracker": "bytetrack.yaml",
-        "conf": 0.6,
-        "iou": 0.5,
-        "classes": None,
-        "verbose": False
-    }
-
-    # 定义车辆类别映射
-    vehicle_classes = [
-        "bicycle", "car", "van", "truck",
-        "tricycle", "awning-tricycle", "bus", "motor"
-    ]
-
-    # 禁用警告信息
-    warnings.filterwarnings("ignore")
-
-    with tqdm(total=total_frames, desc="Processing Video", unit="frame") as pbar:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # 绘制基准线
-            cv2.line(frame, (0, baseline_y), (frame_width, baseline_y), (0, 0, 255), 2)
-
-            # YOLO推理
-            yolo_results = yolo_model.predict(frame, conf=0.5, verbose=False)
-            yolo_boxes = []
-            yolo_scores = []
-            yolo_labels = []
-            for box in yolo_results[0].boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                conf = box.conf.item()
-                cls = int(box.cls.item())
-                yolo_boxes.append([x1 / frame_width, y1 / frame_height, x2 / frame_width, y2 / frame_height])
-                yolo_scores.append(conf)
-                yolo_labels.append(cls)
-
-            # Faster R-CNN推理
-            faster_output = faster_model(frame)
-            faster_boxes = []
-            faster_scores = []
-            faster_labels = []
-            for box, score, cls in zip(faster_output["instances"].pred_boxes,
-                                       faster_output["instances"].scores,
-                                       faster_output["instances"].pred_classes):
-                x1, y1, x2, y2 = box.cpu().numpy()
-                faster_boxes.append([x1 / frame_width, y1 / frame_height, x2 / frame_width, y2 / frame_height])
-                faster_scores.append(score.item())
-                faster_labels.append(cls.item())
-
-            # WBF融合
-            boxes_list = [yolo_boxes, faster_boxes]
-            scores_list = [yolo_scores, faster_scores]
-            labels_list = [yolo_labels, faster_labels]
-            weights = [2, 1]
-
-            fused_boxes, fused_scores, fused_labels = weighted_boxes_fusion(
-                boxes_list,
-                scores_list,
-                labels_list,
-                weights=weights,
-                iou_thr=0.5,
-                skip_box_thr=0.4
-            )
-
-            # 转换回绝对坐标
-            fused_boxes[:, 0] *= frame_width
-            fused_boxes[:, 1] *= frame_height
-            fused_boxes[:, 2] *= frame_width
-            fused_boxes[:, 3] *= frame_height
-
-            # 转换为检测结果格式用于跟踪
-            detections = []
-            for box, score, label in zip(fused_boxes, fused_scores, fused_labels):
-                x1, y1, x2, y2 = map(int, box)
-                detections.append([x1, y1, x2, y2, score, label])
-
-            # 执行跟踪
-            if len(detections) > 0:
-                detections = np.array(detections)
-                tracker_config["classes"] = [int(label) for label in detections[:, 5]]
-                results = yolo_model.track(frame, **tracker_config)
-
-                if results[0].boxes.id is not None:
-                    boxes = results[0].boxes.xyxy.cpu().numpy()
-                    track_ids = results[0].boxes.id.cpu().numpy().astype(int)
-
-                    # 更新跟踪状态
-                    for box, track_id in zip(boxes, track_ids):
-                        x1, y1, x2, y2 = map(int, box)
-                        center_x = (x1 + x2) // 2
-                        center_y = (y1 + y2) // 2
-
-                        if track_id not in tracked_vehicles:
-                            tracked_vehicles[track_id] = {
-                                "state": "above" if center_y < baseline_y else "below",
-                                "history": []
-                            }
-
-                        tracked_vehicles[track_id]["history"].append(center_y)
-                        if len(tracked_vehicles[track_id]["history"]) > 10:
-                            tracked_vehicles[track_id]["history"].pop(0)
-
-                        # 判断进出场
-                        if tracked_vehicles[track_id]["state"] == "above" and all(
-                                y >= baseline_y for y in tracked_vehicles[track_id]["history"][-3:]):
-                            total_in += 1
-                            tracked_vehicles[track_id]["state"] = "counted"
-                        elif tracked_vehicles[track_id]["state"] == "below" and all(
-                                y <= baseline_y for y in tracked_vehicles[track_id]["history"][-3:]):
-                            total_out += 1
-                            tracked_vehicles[track_id]["state"] = "counted"
-
-                        # 绘制框和ID
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, f"ID: {track_id}", (x1, y1 - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-
-            # 显示统计信息
-            info_text = [
-                f"In: {total_in}",
-                f"Out: {total_out}"
-            ]
-            y_offset = 30
-            for text in info_text:
-                cv2.putText(frame, text, (20, y_offset),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                y_offset += 30
-
-            out.write(frame)
-            pbar.update(1)
-
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    print(f"处理完成 | 入场车辆数: {total_in}, 出场车辆数: {total_out}")
-    print(f"结果保存至: {output_video_path}")
+from functools import partial
+
+from checkpoint import SEGMENT_FRAMES, run_video_counting_resumable
+from ensemble import ADAPTIVE_EVERY_N, build_wbf_detector
+from metrics_exporter import serve_metrics
+from model_registry import FASTER_QUANTIZE, YOLO_BACKEND
+from motion_gate import MotionGate
+from tiling import DEFAULT_TILE_OVERLAP
+from video_pipeline import run_video_counting, run_stream_counting
+
+
+def build_detector(tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP, parallel=True, adaptive=False,
+                   every_n=ADAPTIVE_EVERY_N, quantize_faster=FASTER_QUANTIZE, roi=None, backend=YOLO_BACKEND):
+    """
+    构建批量检测函数 detect_batch(frames) -> [(boxes, scores, labels), ...]
+    YOLO 和 Faster R-CNN 同时推理，WBF融合后的框直接送入跟踪器
+    tile_size 不为空时对每帧做重叠切片推理，提高小目标召回率
+    adaptive=True 时 Faster R-CNN 只在 YOLO 不确定、场景密集或每 every_n 帧时运行
+    quantize_faster=True 时 Faster R-CNN 使用INT8动态量化（CPU）
+    roi 为计数线附近的条带比例（如 0.2）或多边形顶点列表时，只检测该区域
+    backend 为YOLO的推理后端（"torch"/"onnx"/"openvino"）
+    """
+    return build_wbf_detector(yolo_conf=0.5, tile_size=tile_size, tile_overlap=tile_overlap, parallel=parallel,
+                              adaptive=adaptive, every_n=every_n, quantize_faster=quantize_faster, roi=roi,
+                              backend=backend)
+
+
+def count_vehicles_video(input_video_path, output_video_path=None, batch_size=1, stride=1, counts_only=False,
+                         tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP, parallel=True, adaptive=False,
+                         every_n=ADAPTIVE_EVERY_N, quantize_faster=FASTER_QUANTIZE, roi=None, motion_threshold=None,
+                         metrics_port=None, resumable=False, segment_frames=SEGMENT_FRAMES, backend=YOLO_BACKEND,
+                         **io_options):
+    # batch_size > 1 时多帧合并为一次前向传播；stride > 1 时每 stride 帧检测一次
+    # counts_only=True 或不指定输出路径时跳过绘制和视频编码，只返回计数结果
+    # parallel=False 时两个模型依次推理（用于对比并行带来的收益）
+    # adaptive=True 时结果中的 "ensemble" 记录 Faster R-CNN 的触发统计
+    # motion_threshold 不为空时启用运动检测门控，画面静止（变化像素占比低于阈值）的帧跳过检测
+    # metrics_port 不为空时在该端口提供 Prometheus 指标端点 /metrics（处理期间实时更新）
+    # resumable=True 时每 segment_frames 帧保存一次检查点，中断后再次调用从检查点继续（见 checkpoint.py）
+    # backend 为YOLO的推理后端（"torch"/"onnx"/"openvino"）
+    # io_options: 视频读写参数 io_backend（"opencv"/"pyav"）、codec、crf
+    detector = build_detector(tile_size, tile_overlap, parallel, adaptive, every_n, quantize_faster, roi, backend)
+    motion_gate = MotionGate(motion_threshold, roi=roi) if motion_threshold is not None else None
+    run = run_video_counting
+    if resumable:
+        detector_config = {"detector": "WBF", "tile_size": tile_size, "tile_overlap": tile_overlap,
+                           "adaptive": adaptive, "every_n": every_n, "quantize_faster": quantize_faster, "roi": roi,
+                           "motion_threshold": motion_threshold, "backend": backend}
+        run = partial(run_video_counting_resumable, segment_frames=segment_frames, detector_config=detector_config)
+    try:
+        with serve_metrics(metrics_port) as metrics:
+            result = run(input_video_path, output_video_path, detector, batch_size=batch_size, stride=stride,
+                         counts_only=counts_only, motion_gate=motion_gate, metrics=metrics, **io_options)
+    finally:
+        detector.close()
+    if result is not None and adaptive:
+        result["ensemble"] = detector.stats()
+        print(f"Faster R-CNN 触发率: {result['ensemble']['fire_rate']:.1%} "
+              f"({result['ensemble']['secondary_frames']}/{result['ensemble']['frames']} 帧)")
+    return result
+
+
+def count_vehicles_stream(source, latency_budget=0.5, output_video_path=None, on_count=None, tile_size=None,
+                          tile_overlap=DEFAULT_TILE_OVERLAP, parallel=True, adaptive=False, every_n=ADAPTIVE_EVERY_N,
+                          quantize_faster=FASTER_QUANTIZE, roi=None, metrics_port=None, backend=YOLO_BACKEND,
+                          **kwargs):
+    # 实时视频流（摄像头/RTSP/命名管道/循环文件），推理跟不上时按延迟预算丢帧
+    detector = build_detector(tile_size, tile_overlap, parallel, adaptive, every_n, quantize_faster, roi, backend)
+    try:
+        with serve_metrics(metrics_port) as metrics:
+            result = run_stream_counting(source, detector, latency_budget=latency_budget,
+                                         output_video_path=output_video_path, on_count=on_count, metrics=metrics,
+                                         **kwargs)
+    finally:
+        detector.close()
+    if result is not None and adaptive:
+        result["ensemble"] = detector.stats()
+    return result
 
 
 if __name__ == "__main__":
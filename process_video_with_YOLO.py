@@ -1,10 +1,24 @@
-from ultralytics import YOLO
-import cv2
-from tqdm import tqdm
-
-def count_vehicles_video(input_video_path, output_video_path):
-    # 加载模型
-    model = YOLO("YOLO_VisDrone.pt")
+from functools import partial
+
+from checkpoint import SEGMENT_FRAMES, run_video_counting_resumable
+from detectors import detect_yolo
+from metrics_exporter import serve_metrics
+from model_registry import YOLO_BACKEND, get_yolo
+from motion_gate import MotionGate
+from roi import with_roi
+from tiling import DEFAULT_TILE_OVERLAP, tiled
+from video_pipeline import VEHICLE_CLASSES, run_video_counting, run_stream_counting
+
+
+def build_detector(tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP, backend=YOLO_BACKEND, roi=None):
+    """
+    构建批量检测函数 detect_batch(frames) -> [(boxes, scores, labels), ...]
+    tile_size 不为空时对每帧做重叠切片推理，提高小目标召回率
+    backend="onnx"/"openvino" 时使用导出的模型在CPU上推理，返回结果格式不变
+    roi 为计数线附近的条带比例（如 0.2）或多边形顶点列表时，只检测该区域
+    """
+    # 获取模型（进程内只加载一次）
+    model = get_yolo(backend=backend)
 
     # 获取类别名称映射
     class_names = model.names
@@ -12,120 +26,48 @@ def count_vehicles_video(input_video_path, output_video_path):
     # 定义车辆类别（与图片处理保持一致）
     vehicle_classes = {
         class_id: class_name for class_id, class_name in class_names.items()
-        if class_name.lower() in [
-            "bicycle", "car", "van", "truck", "tricycle",
-            "awning-tricycle", "bus", "motor"
-        ]
+        if class_name.lower() in VEHICLE_CLASSES
     }
 
-    # 视频输入输出设置
-    cap = cv2.VideoCapture(input_video_path)
-    if not cap.isOpened():
-        print(f"无法打开视频文件: {input_video_path}")
-        return
-
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))  # 获取视频总帧数
-
-    # 初始化视频写入器
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video_path, fourcc, fps, (frame_width, frame_height))
-
-    # 基准线的 y 坐标（视频中间位置）
-    baseline_y = frame_height // 2
-
-    # 初始化跟踪相关变量
-    tracked_vehicles = {}  # 存储已追踪车辆ID及其状态 {"track_id": "state"}
-    total_in = 0  # 累计入场计数器
-    total_out = 0  # 累计出场计数器
-
-    # 配置跟踪器参数
-    tracker_config = {
-        "persist": True,
-        "tracker": "bytetrack.yaml",
-        "conf": 0.6,
-        "iou": 0.5,
-        "classes": list(vehicle_classes.keys()),
-        "verbose": False
-    }
-
-    # 使用 tqdm 显示进度条
-    with tqdm(total=total_frames, desc="Processing Video", unit="frame") as pbar:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # 绘制基准线
-            cv2.line(frame, (0, baseline_y), (frame_width, baseline_y), (0, 0, 255), 2)
-
-            # 执行带追踪的预测
-            results = model.track(frame, **tracker_config)
-
-            if results[0].boxes.id is not None:
-                # 获取检测信息
-                boxes = results[0].boxes.xyxy.cpu().numpy()
-                class_ids = results[0].boxes.cls.cpu().numpy().astype(int)
-                track_ids = results[0].boxes.id.cpu().numpy().astype(int)
-
-                # 处理每个检测目标
-                for box, class_id, track_id in zip(boxes, class_ids, track_ids):
-                    if class_id in vehicle_classes:
-                        # 获取检测框中心点坐标
-                        x1, y1, x2, y2 = map(int, box)
-                        center_x = (x1 + x2) // 2
-                        center_y = (y1 + y2) // 2
-
-                        # 更新轨迹历史
-                        if track_id not in tracked_vehicles:
-                            tracked_vehicles[track_id] = {"state": "above" if center_y < baseline_y else "below",
-                                                          "history": []}
-
-                        tracked_vehicles[track_id]["history"].append(center_y)
-                        if len(tracked_vehicles[track_id]["history"]) > 10:  # 保留最近 10 帧的轨迹
-                            tracked_vehicles[track_id]["history"].pop(0)
-
-                        # 判断轨迹方向
-                        if tracked_vehicles[track_id]["state"] == "above" and all(
-                                y >= baseline_y for y in tracked_vehicles[track_id]["history"][-3:]):
-                            total_in += 1
-                            tracked_vehicles[track_id]["state"] = "counted"
-                        elif tracked_vehicles[track_id]["state"] == "below" and all(
-                                y <= baseline_y for y in tracked_vehicles[track_id]["history"][-3:]):
-                            total_out += 1
-                            tracked_vehicles[track_id]["state"] = "counted"
-
-                        # 绘制检测框和ID
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, f"ID: {track_id}", (x1, y1 - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-
-            # 显示统计信息
-            info_text = [
-                f"In: {total_in}",
-                f"Out: {total_out}"
-            ]
-
-            y_offset = 30
-            for text in info_text:
-                cv2.putText(frame, text, (20, y_offset),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                y_offset += 30
-
-            # 写入输出帧
-            out.write(frame)
-
-            # 更新进度条
-            pbar.update(1)
-
-    # 释放资源
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    print(f"处理完成 | 入场车辆数: {total_in}, 出场车辆数: {total_out}")
-    print(f"结果视频保存至: {output_video_path}")
+    # 检测参数（与原 model.track 的配置一致，跟踪由 VehicleTracker 完成）
+    def detect_batch(frames):
+        return detect_yolo(model, frames, conf=0.6, iou=0.5, classes=list(vehicle_classes.keys()))
+
+    if tile_size:
+        detect_batch = tiled(detect_batch, tile_size=tile_size, overlap=tile_overlap)
+    return with_roi(detect_batch, roi)
+
+
+def count_vehicles_video(input_video_path, output_video_path=None, batch_size=1, stride=1, counts_only=False,
+                         tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP, backend=YOLO_BACKEND, roi=None,
+                         motion_threshold=None, metrics_port=None, resumable=False, segment_frames=SEGMENT_FRAMES,
+                         **io_options):
+    # batch_size > 1 时多帧合并为一次前向传播；stride > 1 时每 stride 帧检测一次
+    # counts_only=True 或不指定输出路径时跳过绘制和视频编码，只返回计数结果
+    # motion_threshold 不为空时启用运动检测门控，画面静止（变化像素占比低于阈值）的帧跳过检测
+    # metrics_port 不为空时在该端口提供 Prometheus 指标端点 /metrics（处理期间实时更新）
+    # resumable=True 时每 segment_frames 帧保存一次检查点，中断后再次调用从检查点继续（见 checkpoint.py）
+    # io_options: 视频读写参数 io_backend（"opencv"/"pyav"）、codec、crf
+    detect_batch = build_detector(tile_size, tile_overlap, backend, roi)
+    motion_gate = MotionGate(motion_threshold, roi=roi) if motion_threshold is not None else None
+    run = run_video_counting
+    if resumable:
+        detector_config = {"detector": "YOLO", "tile_size": tile_size, "tile_overlap": tile_overlap, "backend": backend,
+                           "roi": roi, "motion_threshold": motion_threshold}
+        run = partial(run_video_counting_resumable, segment_frames=segment_frames, detector_config=detector_config)
+    with serve_metrics(metrics_port) as metrics:
+        return run(input_video_path, output_video_path, detect_batch, batch_size=batch_size, stride=stride,
+                   counts_only=counts_only, motion_gate=motion_gate, metrics=metrics, **io_options)
+
+
+def count_vehicles_stream(source, latency_budget=0.5, output_video_path=None, on_count=None, tile_size=None,
+                          tile_overlap=DEFAULT_TILE_OVERLAP, backend=YOLO_BACKEND, roi=None, metrics_port=None,
+                          **kwargs):
+    # 实时视频流（摄像头/RTSP/命名管道/循环文件），推理跟不上时按延迟预算丢帧
+    detect_batch = build_detector(tile_size, tile_overlap, backend, roi)
+    with serve_metrics(metrics_port) as metrics:
+        return run_stream_counting(source, detect_batch, latency_budget=latency_budget,
+                                   output_video_path=output_video_path, on_count=on_count, metrics=metrics, **kwargs)
 
 
 if __name__ == "__main__":
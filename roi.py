@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+# 默认感兴趣区域：计数线上下各占画面高度的比例
+DEFAULT_ROI_BAND = 0.2
+
+
+def band_region(height, width, band=DEFAULT_ROI_BAND):
+    """计数线（画面中间，与 run_video_counting 一致）上下各 band * height 的水平条带，返回 (x1, y1, x2, y2)"""
+    baseline_y = height // 2
+    half = int(round(height * band))
+    return 0, max(0, baseline_y - half), width, min(height, baseline_y + half)
+
+
+def polygon_region(polygon, height, width):
+    """任意多边形区域：返回外接矩形 (x1, y1, x2, y2) 和外接矩形内的多边形掩码"""
+    points = np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.fillPoly(mask, [points], 255)
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        raise ValueError(f"ROI多边形不在画面内: {polygon}")
+    x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+    return (x1, y1, x2, y2), mask[y1:y2, x1:x2]
+
+
+def resolve_roi(roi, height, width):
+    """
+    roi 为浮点数时表示计数线附近的条带（上下各占画面高度的比例），为点列表 [(x, y), ...] 时表示多边形
+    返回 (裁剪矩形, 多边形掩码或 None)
+    """
+    if isinstance(roi, (int, float)):
+        return band_region(height, width, roi), None
+    return polygon_region(roi, height, width)
+
+
+def with_roi(detect_fn, roi):
+    """
+    把批量检测函数包装为只检测感兴趣区域的版本：每帧只把裁剪后的区域送入检测器，
+    检测框映射回整帧坐标，跟踪和计数逻辑不受影响。多边形区域外的像素置黑，中心点在区域外的框被丢弃
+    roi 为 None 时原样返回 detect_fn
+    """
+    if roi is None:
+        return detect_fn
+    regions = {}  # 按帧尺寸缓存裁剪区域
+
+    def region_for(shape):
+        height, width = shape[:2]
+        if (height, width) not in regions:
+            (x1, y1, x2, y2), mask = resolve_roi(roi, height, width)
+            regions[(height, width)] = (x1, y1, x2, y2), mask
+            ratio = (x2 - x1) * (y2 - y1) / (height * width)
+            print(f"ROI: 检测区域 {x2 - x1}x{y2 - y1}（占整帧 {ratio:.0%}）")
+        return regions[(height, width)]
+
+    def detect_batch(images):
+        crops, regions_used = [], []
+        for img in images:
+            (x1, y1, x2, y2), mask = region_for(img.shape)
+            crop = np.ascontiguousarray(img[y1:y2, x1:x2])
+            if mask is not None:
+                crop = cv2.bitwise_and(crop, crop, mask=mask)
+            crops.append(crop)
+            regions_used.append(((x1, y1, x2, y2), mask))
+
+        results = []
+        for ((x1, y1, _, _), mask), (boxes, scores, labels) in zip(regions_used, detect_fn(crops)):
+            if mask is not None and len(boxes):
+                # 只保留中心点在多边形内的框
+                cx = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(int), 0, mask.shape[1] - 1)
+                cy = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2).astype(int), 0, mask.shape[0] - 1)
+                keep = mask[cy, cx] > 0
+                boxes, scores, labels = boxes[keep], scores[keep], labels[keep]
+            results.append((boxes + np.asarray((x1, y1, x1, y1), dtype=np.float32), scores, labels))
+        return results
+
+    return detect_batch
@@ -1,3 +1,6 @@
+import time
+
+import torch
 from detectron2.engine import DefaultPredictor
 from detectron2.config import get_cfg
 from detectron2 import model_zoo
@@ -6,6 +9,11 @@ from detectron2.data.datasets import register_coco_instances
 from detectron2.evaluation import COCOEvaluator, inference_on_dataset
 from detectron2.data import build_detection_test_loader
 
+from model_registry import quantize_faster_rcnn
+
+# 是否额外在CPU上对比FP32与INT8动态量化模型的精度和速度（会在CPU上再完整评估两遍测试集，耗时很长）
+COMPARE_INT8 = False
+
 
 # 注册VisDrone测试集
 def register_visdrone_testset():
@@ -21,6 +29,52 @@ def register_visdrone_testset():
     )
 
 
+def time_forward(model):
+    """在模型前向传播前后挂钩，只累计前向传播的耗时（不含数据加载和COCO评估）"""
+    timing = {"start": 0.0, "total": 0.0, "count": 0}
+
+    def before(module, inputs):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        timing["start"] = time.perf_counter()
+
+    def after(module, inputs, outputs):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        timing["total"] += time.perf_counter() - timing["start"]
+        timing["count"] += 1
+
+    model.register_forward_pre_hook(before)
+    model.register_forward_hook(after)
+    return timing
+
+
+def evaluate(cfg, quantize=False, output_dir="./output/visdrone_faster_rcnn/test_results"):
+    """在测试集上评估模型，返回 (bbox指标, 每张图片的平均前向传播耗时秒数)"""
+    predictor = DefaultPredictor(cfg)
+    if quantize:
+        quantize_faster_rcnn(predictor)
+    timing = time_forward(predictor.model)
+    test_loader = build_detection_test_loader(cfg, "visdrone_test")
+    evaluator = COCOEvaluator("visdrone_test", output_dir=output_dir)
+    metrics = inference_on_dataset(predictor.model, test_loader, evaluator)
+    return metrics["bbox"], timing["total"] / max(timing["count"], 1)
+
+
+def compare_int8(cfg):
+    """CPU上对比FP32与INT8动态量化：报告mAP变化和加速比"""
+    cpu_cfg = cfg.clone()
+    cpu_cfg.MODEL.DEVICE = "cpu"
+    fp32, fp32_time = evaluate(cpu_cfg, output_dir="./output/visdrone_faster_rcnn/test_results_cpu_fp32")
+    int8, int8_time = evaluate(cpu_cfg, quantize=True, output_dir="./output/visdrone_faster_rcnn/test_results_cpu_int8")
+
+    print("\n=== INT8 动态量化对比（CPU） ===")
+    for key in ("AP", "AP50", "AP75"):
+        print(f"{key}: FP32 {fp32[key]:.3f} -> INT8 {int8[key]:.3f} ({int8[key] - fp32[key]:+.3f})")
+    print(f"每张图片前向传播耗时: FP32 {fp32_time * 1000:.1f}ms -> INT8 {int8_time * 1000:.1f}ms, "
+          f"加速 {fp32_time / int8_time:.2f}x")
+
+
 if __name__ == "__main__":
     # 注册测试集
     register_visdrone_testset()
@@ -37,23 +91,14 @@ if __name__ == "__main__":
     cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.5  # 设置测试阈值
     cfg.DATASETS.TEST = ("visdrone_test",)
 
-    # 初始化预测器
-    predictor = DefaultPredictor(cfg)
-
-    # 构建测试数据加载器
-    test_loader = build_detection_test_loader(cfg, "visdrone_test")
-
-    # 初始化评估器
-    evaluator = COCOEvaluator(
-        "visdrone_test",
-        output_dir="./output/visdrone_faster_rcnn/test_results"  # 测试结果保存路径
-    )
-
-    # 执行评估
-    metrics = inference_on_dataset(predictor.model, test_loader, evaluator)
+    # 执行评估（测试结果保存在 ./output/visdrone_faster_rcnn/test_results）
+    bbox, _ = evaluate(cfg)
 
     # 打印关键指标
     print("\n=== 测试结果 ===")
-    print(f"mAP@[0.5:0.95]: {metrics['bbox']['AP']:.3f}")
-    print(f"AP50: {metrics['bbox']['AP50']:.3f}")
-    print(f"AP75: {metrics['bbox']['AP75']:.3f}")
+    print(f"mAP@[0.5:0.95]: {bbox['AP']:.3f}")
+    print(f"AP50: {bbox['AP50']:.3f}")
+    print(f"AP75: {bbox['AP75']:.3f}")
+
+    if COMPARE_INT8:
+        compare_int8(cfg)
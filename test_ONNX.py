@@ -0,0 +1,79 @@
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from detectors import detect_yolo
+from model_registry import YOLO_WEIGHTS, get_yolo
+
+# 对比用的测试图片（VisDrone测试集）
+IMAGE_DIR = "../VisDrone2019-YOLO/images/test"
+NUM_IMAGES = 50
+
+
+def box_iou(a, b):
+    """两组框的IoU矩阵"""
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def check_parity(images, conf=0.5):
+    """
+    对比 PyTorch 与 ONNX Runtime 的检测结果：
+    每个 PyTorch 框在 ONNX 结果中找IoU最大的框，统计匹配率、类别一致率和分数误差
+    """
+    torch_model = get_yolo(YOLO_WEIGHTS, backend="torch")
+    onnx_model = get_yolo(YOLO_WEIGHTS, backend="onnx")
+    matched, total, same_class, score_diffs, count_diffs = 0, 0, 0, [], []
+    for img in images:
+        (torch_boxes, torch_scores, torch_labels), = detect_yolo(torch_model, [img], conf=conf)
+        (onnx_boxes, onnx_scores, onnx_labels), = detect_yolo(onnx_model, [img], conf=conf)
+        count_diffs.append(abs(len(torch_boxes) - len(onnx_boxes)))
+        total += len(torch_boxes)
+        if len(torch_boxes) == 0 or len(onnx_boxes) == 0:
+            continue
+        ious = box_iou(torch_boxes, onnx_boxes)
+        best = ious.argmax(axis=1)
+        hit = ious[np.arange(len(best)), best] > 0.9
+        matched += int(hit.sum())
+        same_class += int((torch_labels[hit] == onnx_labels[best[hit]]).sum())
+        score_diffs.extend(np.abs(torch_scores[hit] - onnx_scores[best[hit]]).tolist())
+
+    print("=== 一致性 ===")
+    print(f"框匹配率(IoU>0.9): {matched / max(total, 1):.2%} ({matched}/{total})")
+    print(f"类别一致率: {same_class / max(matched, 1):.2%}")
+    print(f"分数误差: 平均 {np.mean(score_diffs) if score_diffs else 0:.4f}, "
+          f"最大 {np.max(score_diffs) if score_diffs else 0:.4f}")
+    print(f"每张图片框数差异: 平均 {np.mean(count_diffs):.2f}, 最大 {np.max(count_diffs)}")
+
+
+def benchmark(images, batch_sizes=(1, 8), repeats=3):
+    """PyTorch 与 ONNX Runtime 的吞吐量对比（张/秒）"""
+    print("=== 吞吐量 ===")
+    for batch_size in batch_sizes:
+        throughput = {}
+        for backend in ("torch", "onnx"):
+            model = get_yolo(YOLO_WEIGHTS, backend=backend)
+            detect_yolo(model, images[:batch_size])  # 预热
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for i in range(0, len(images), batch_size):
+                    detect_yolo(model, images[i:i + batch_size])
+            throughput[backend] = repeats * len(images) / (time.perf_counter() - start)
+        print(f"batch={batch_size}: torch {throughput['torch']:.1f} 张/秒, onnx {throughput['onnx']:.1f} 张/秒, "
+              f"加速 {throughput['onnx'] / throughput['torch']:.2f}x")
+
+
+if __name__ == "__main__":
+    paths = sorted(glob.glob(f"{IMAGE_DIR}/*.jpg"))[:NUM_IMAGES]
+    images = [img for img in (cv2.imread(path) for path in paths) if img is not None]
+    if not images:
+        print(f"未找到测试图片: {IMAGE_DIR}")
+    else:
+        check_parity(images)
+        benchmark(images)
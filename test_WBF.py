@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+from ensemble_boxes import weighted_boxes_fusion as reference_wbf
+
+from detectors import WBF_WEIGHTS, WBF_IOU_THR, WBF_SKIP_BOX_THR
+from wbf import weighted_boxes_fusion
+
+
+def random_detections(rng, num_boxes, num_classes=8):
+    """模拟两个模型对同一画面的检测：第二个模型的框在第一个模型的框附近抖动，并带有少量独有的框"""
+    centers = rng.uniform(0.05, 0.95, size=(num_boxes, 2))
+    sizes = rng.uniform(0.01, 0.08, size=(num_boxes, 2))
+    labels = rng.integers(0, num_classes, size=num_boxes)
+    detections = []
+    for _ in range(len(WBF_WEIGHTS)):
+        jitter = rng.normal(0, 0.005, size=(num_boxes, 2))
+        boxes = np.concatenate([centers + jitter - sizes / 2, centers + jitter + sizes / 2], axis=1)
+        keep = rng.uniform(size=num_boxes) > 0.15
+        scores = rng.uniform(0.2, 1.0, size=num_boxes).astype(np.float32)
+        detections.append((boxes[keep].astype(np.float32), scores[keep], labels[keep]))
+    return detections
+
+
+def fuse(fn, detections):
+    return fn([d[0] for d in detections], [d[1] for d in detections], [d[2] for d in detections],
+              weights=WBF_WEIGHTS, iou_thr=WBF_IOU_THR, skip_box_thr=WBF_SKIP_BOX_THR)
+
+
+def check_equivalence(trials=300):
+    """与 ensemble_boxes 的结果逐框对比"""
+    rng = np.random.default_rng(0)
+    max_diff = 0.0
+    for trial in range(trials):
+        detections = random_detections(rng, int(rng.integers(0, 300)))
+        expected = fuse(reference_wbf, detections)
+        actual = fuse(weighted_boxes_fusion, detections)
+        assert len(expected[0]) == len(actual[0]), f"第 {trial} 组框数不一致"
+        assert np.array_equal(expected[2], actual[2]), f"第 {trial} 组类别不一致"
+        for e, a in zip(expected[:2], actual[:2]):
+            if len(e):
+                max_diff = max(max_diff, float(np.abs(e - a).max()))
+    assert max_diff < 1e-6, f"最大误差过大: {max_diff}"
+    print(f"等价性测试通过 | {trials} 组随机场景, 最大误差 {max_diff:.2e}")
+
+
+def benchmark(box_counts=(10, 50, 100, 200, 500, 1000), repeats=5):
+    """不同框数下两种实现的耗时对比"""
+    rng = np.random.default_rng(1)
+    print(f"{'框数/模型':>10} {'ensemble_boxes(ms)':>20} {'wbf(ms)':>10} {'加速比':>8}")
+    for num_boxes in box_counts:
+        detections = random_detections(rng, num_boxes)
+        timings = []
+        for fn in (reference_wbf, weighted_boxes_fusion):
+            fuse(fn, detections)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                fuse(fn, detections)
+            timings.append((time.perf_counter() - start) / repeats * 1000)
+        print(f"{num_boxes:>10} {timings[0]:>20.2f} {timings[1]:>10.2f} {timings[0] / timings[1]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    check_equivalence()
+    benchmark()
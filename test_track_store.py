@@ -0,0 +1,42 @@
+import numpy as np
+
+from video_pipeline import LineCounter
+from vehicle_tracker import VehicleTracker
+
+# 合成画面尺寸及计数线位置
+FRAME_SHAPE = (720, 1280, 3)
+BASELINE_Y = 360
+
+
+def run_occlusion(lead_frames, gap_frames):
+    """
+    车辆在线上方停留 lead_frames 帧，被遮挡 gap_frames 帧（无检测），再出现在线下方，
+    返回 (重新出现时的轨迹ID是否与遮挡前相同, 入场计数)
+    """
+    tracker = VehicleTracker()
+    counter = LineCounter(BASELINE_Y, max_track_age=tracker.max_lost_frames, fps=30)
+    empty = (np.empty((0, 4)), np.empty(0), np.empty(0))
+    above = (np.array([[600, 320, 660, 380]]), np.array([0.9]), np.array([1]))
+    below = (np.array([[600, 345, 660, 405]]), np.array([0.9]), np.array([1]))
+
+    track_ids = []
+    for detections in [above] * lead_frames + [empty] * gap_frames + [below] * 5:
+        boxes, ids, classes, _ = tracker.update(*detections, FRAME_SHAPE)
+        counter.update(boxes, ids, classes)
+        track_ids.extend(ids.tolist())
+    return len(set(track_ids)) == 1, counter.total_in
+
+
+def test_gap_of_max_lost_frames():
+    """遮挡恰好 max_lost_frames 帧：ByteTrack 找回原轨迹时计数状态不能已被清除（与清理周期的相位无关）"""
+    max_lost = VehicleTracker().max_lost_frames
+    for gap in (max_lost - 1, max_lost):
+        for lead in range(3, 3 + max_lost):
+            same_track, total_in = run_occlusion(lead, gap)
+            if same_track:
+                assert total_in == 1, f"遮挡 {gap} 帧后轨迹被找回但越线未计数 (lead={lead}, total_in={total_in})"
+    print(f"遮挡 {max_lost - 1}/{max_lost} 帧: 通过")
+
+
+if __name__ == "__main__":
+    test_gap_of_max_lost_frames()
@@ -0,0 +1,118 @@
+import numpy as np
+
+from detections import normalize_boxes, to_pixels
+from wbf import weighted_boxes_fusion
+
+# 默认切片参数：切片边长（像素）和相邻切片的重叠比例
+DEFAULT_TILE_SIZE = 640
+DEFAULT_TILE_OVERLAP = 0.2
+
+
+def _tile_starts(length, tile_size, step):
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, step))
+    # 最后一块与图片边缘对齐，避免越界或留下未覆盖的区域
+    starts.append(length - tile_size)
+    return starts
+
+
+def make_tiles(height, width, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP):
+    """返回覆盖整张图片的切片坐标列表 [(x1, y1, x2, y2), ...]，相邻切片按 overlap 比例重叠"""
+    step = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _tile_starts(height, tile_size, step)
+        for x in _tile_starts(width, tile_size, step)
+    ]
+
+
+def nms(boxes, scores, labels, iou_thr=0.5, metric="iou"):
+    """
+    按类别的向量化NMS，返回保留的索引
+    metric="iou" 为交并比；metric="ios" 为交集占较小框的比例，适合合并被切片边界截断的框
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+    # 不同类别的框平移到互不重叠的区域，一次完成所有类别的NMS
+    offsets = labels.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    # 置信度相同时优先保留面积更大的框（完整框优先于被切片截断的框）
+    order = np.lexsort((-areas, -scores))
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        if metric == "ios":
+            overlap = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        else:
+            overlap = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[overlap <= iou_thr]
+    return np.asarray(keep, dtype=int)
+
+
+def merge_detections(boxes, scores, labels, width, height, method="nms_ios", iou_thr=0.5):
+    """合并所有切片（和整图）的像素坐标检测结果"""
+    if len(boxes) == 0:
+        return boxes, scores, labels
+    if method == "wbf":
+        fused_boxes, fused_scores, fused_labels = weighted_boxes_fusion(
+            [normalize_boxes(boxes, width, height)], [scores], [labels],
+            iou_thr=iou_thr, skip_box_thr=0.0
+        )
+        return to_pixels(fused_boxes, width, height), fused_scores, np.asarray(fused_labels).astype(int)
+    keep = nms(boxes, scores, labels, iou_thr=iou_thr, metric="ios" if method == "nms_ios" else "iou")
+    return boxes[keep], scores[keep], labels[keep]
+
+
+def sliced_detect(images, detect_fn, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP, tile_batch=16,
+                  full_frame=True, merge="nms_ios", iou_thr=0.5):
+    """
+    切片推理：把每张图片切成重叠的切片，所有切片按 tile_batch 分批送入检测器，
+    坐标映射回原图后合并。full_frame=True 时额外做一次整图推理，保证大目标不被切断
+    detect_fn(images) 需返回每张图片的像素坐标 (boxes, scores, labels)
+    """
+    crops, owners, offsets = [], [], []
+    needs_full = []
+    for image_index, img in enumerate(images):
+        height, width = img.shape[:2]
+        tiles = make_tiles(height, width, tile_size, overlap)
+        for x1, y1, x2, y2 in tiles:
+            crops.append(np.ascontiguousarray(img[y1:y2, x1:x2]))
+            owners.append(image_index)
+            offsets.append((x1, y1, x1, y1))
+        if full_frame and len(tiles) > 1:
+            needs_full.append(image_index)
+
+    collected = [[] for _ in images]
+    for start in range(0, len(crops), tile_batch):
+        for k, (boxes, scores, labels) in enumerate(detect_fn(crops[start:start + tile_batch])):
+            index = start + k
+            collected[owners[index]].append((boxes + np.asarray(offsets[index], dtype=np.float32), scores, labels))
+
+    if needs_full:
+        for image_index, detections in zip(needs_full, detect_fn([images[i] for i in needs_full])):
+            collected[image_index].append(detections)
+
+    merged = []
+    for img, detections in zip(images, collected):
+        height, width = img.shape[:2]
+        boxes = np.concatenate([d[0] for d in detections]).astype(np.float32).reshape(-1, 4)
+        scores = np.concatenate([d[1] for d in detections]).astype(np.float32)
+        labels = np.concatenate([d[2] for d in detections]).astype(int)
+        merged.append(merge_detections(boxes, scores, labels, width, height, merge, iou_thr))
+    return merged
+
+
+def tiled(detect_fn, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP, **kwargs):
+    """把普通的批量检测函数包装成切片推理版本，接口不变"""
+    def detect_batch(images):
+        return sliced_detect(images, detect_fn, tile_size=tile_size, overlap=overlap, **kwargs)
+
+    return detect_batch
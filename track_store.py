@@ -0,0 +1,84 @@
+import sys
+from collections import deque
+
+# 清除轨迹前在跟踪器的丢失帧数之外多保留的帧数：ByteTrack 在丢失满 max_age 帧后仍可能找回轨迹
+EVICT_MARGIN = 2
+
+
+class TrackState:
+    """单条轨迹的计数状态：state 为 "above"/"below"/"counted"，history 为最近若干帧的中心点 y 坐标"""
+    __slots__ = ("state", "history", "last_seen")
+
+    def __init__(self, state, history_size, frame_index):
+        self.state = state
+        self.history = deque(maxlen=history_size)  # 固定长度环形缓冲，超出自动丢弃最旧的值
+        self.last_seen = frame_index
+
+
+class TrackStateStore:
+    """
+    有界的轨迹状态存储：
+    超过 max_age + EVICT_MARGIN 帧未出现的轨迹（ByteTrack 已将其删除，ID 不会再出现）会被清除，
+    长时间运行的视频流内存占用只与同时在场的车辆数有关
+    """
+
+    def __init__(self, max_age=30, history_size=10):
+        self.max_age = max_age
+        self.history_size = history_size
+        self.frame_index = 0
+        self.evicted = 0
+        self.peak_size = 0
+        self._states = {}
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, track_id):
+        return track_id in self._states
+
+    def __getitem__(self, track_id):
+        return self._states[track_id]
+
+    def items(self):
+        return self._states.items()
+
+    def get(self, track_id, initial_state):
+        """获取轨迹状态，不存在时以 initial_state 创建，并记录本帧出现过"""
+        vehicle = self._states.get(track_id)
+        if vehicle is None:
+            vehicle = TrackState(initial_state, self.history_size, self.frame_index)
+            self._states[track_id] = vehicle
+            self.peak_size = max(self.peak_size, len(self._states))
+        vehicle.last_seen = self.frame_index
+        return vehicle
+
+    def next_frame(self):
+        """进入下一帧；每隔 max_age 帧清理一次过期轨迹，摊还成本很低"""
+        self.frame_index += 1
+        if self.frame_index % max(self.max_age, 1) == 0:
+            self.evict()
+
+    def evict(self):
+        """清除超过 max_age + EVICT_MARGIN 帧未出现的轨迹，返回清除数量"""
+        threshold = self.frame_index - self.max_age - EVICT_MARGIN
+        stale = [track_id for track_id, vehicle in self._states.items() if vehicle.last_seen < threshold]
+        for track_id in stale:
+            del self._states[track_id]
+        self.evicted += len(stale)
+        return len(stale)
+
+    def memory_bytes(self):
+        """估算当前占用的内存字节数（字典、状态对象及其历史缓冲）"""
+        total = sys.getsizeof(self._states)
+        for track_id, vehicle in self._states.items():
+            total += sys.getsizeof(track_id) + sys.getsizeof(vehicle) + sys.getsizeof(vehicle.history)
+            total += sum(sys.getsizeof(y) for y in vehicle.history)
+        return total
+
+    def stats(self):
+        return {
+            "active_tracks": len(self._states),
+            "peak_tracks": self.peak_size,
+            "evicted_tracks": self.evicted,
+            "memory_bytes": self.memory_bytes()
+        }
@@ -0,0 +1,60 @@
+import numpy as np
+import yaml
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+
+class VehicleTracker:
+    """ByteTrack跟踪器，直接接收检测结果数组（无需再次运行检测模型）"""
+
+    def __init__(self, tracker_config="bytetrack.yaml", frame_rate=30):
+        with open(check_yaml(tracker_config), encoding="utf-8") as f:
+            self.args = IterableSimpleNamespace(**yaml.safe_load(f))
+        try:
+            self.tracker = BYTETracker(args=self.args, frame_rate=frame_rate)
+        except TypeError:  # 新版本ultralytics不再接受frame_rate参数
+            self.tracker = BYTETracker(args=self.args)
+
+    @property
+    def max_lost_frames(self):
+        """丢失轨迹在被ByteTrack删除前最多保留的帧数（由 track_buffer 和帧率决定）"""
+        tracker = self.tracker
+        return getattr(tracker, "max_time_lost", None) or getattr(tracker, "max_frames_lost", self.args.track_buffer)
+
+    def update(self, boxes, scores, labels, frame_shape):
+        """
+        输入像素坐标的检测框 (N, 4)、置信度 (N,) 和类别 (N,)，
+        返回已确认轨迹的 (boxes, track_ids, class_ids, scores)
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        data = np.concatenate([
+            boxes,
+            np.asarray(scores, dtype=np.float32).reshape(-1, 1),
+            np.asarray(labels, dtype=np.float32).reshape(-1, 1)
+        ], axis=1)
+        tracks = self.tracker.update(Boxes(data, frame_shape[:2]))
+        return self._split(tracks)
+
+    def predict(self):
+        """
+        跳过检测的帧调用：不输入检测结果，只用卡尔曼运动模型把现有轨迹推进一帧，
+        返回与 update 相同格式的预测结果。未确认的新轨迹保持不变，等待下一次检测确认
+        """
+        tracker = self.tracker
+        tracker.frame_id += 1
+        active = [track for track in tracker.tracked_stracks if track.is_activated]
+        tracker.multi_predict(active + tracker.lost_stracks)
+        return self._split(np.asarray([track.result for track in active], dtype=np.float32))
+
+    @staticmethod
+    def _split(tracks):
+        if len(tracks) == 0:
+            return (np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=int),
+                    np.empty(0, dtype=int), np.empty(0, dtype=np.float32))
+        # 每行格式: [x1, y1, x2, y2, track_id, score, cls, idx]
+        return tracks[:, :4], tracks[:, 4].astype(int), tracks[:, 6].astype(int), tracks[:, 5]
+
+    def reset(self):
+        self.tracker.reset()
@@ -0,0 +1,178 @@
+import cv2
+import numpy as np
+
+# 默认视频读写后端："opencv"（cv2.VideoCapture/VideoWriter）或 "pyav"（FFmpeg多线程解码、可配置编码器）
+VIDEO_BACKEND = "opencv"
+OPENCV_CODEC = "mp4v"
+PYAV_CODEC = "libx264"
+PYAV_CRF = 23
+PYAV_PRESET = "veryfast"
+
+
+class OpenCVReader:
+    """cv2.VideoCapture 读取，read(buffer) 直接解码到传入的缓冲区"""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def read(self, buffer=None):
+        """读取下一帧，buffer 尺寸匹配时复用，读完返回 None"""
+        ret, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
+        return frame if ret else None
+
+    def grab(self):
+        """跳过一帧（不转换为图像）"""
+        return self.cap.grab()
+
+    def seek(self, frame_index):
+        """定位到第 frame_index 帧（从关键帧解码到目标帧）"""
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVReader:
+    """PyAV（FFmpeg）读取：解码器开启帧级/片级多线程，转换后的图像直接拷贝到传入的缓冲区"""
+
+    def __init__(self, path):
+        import av
+
+        try:
+            self.container = av.open(path)
+        except (av.error.FFmpegError, OSError):
+            self.container = None
+            return
+        stream = self.container.streams.video[0]
+        stream.thread_type = "AUTO"
+        self.width = stream.codec_context.width
+        self.height = stream.codec_context.height
+        self.fps = float(stream.average_rate or stream.guessed_rate or 0)
+        self.frame_count = stream.frames
+        self._stream = stream
+        self._frames = self.container.decode(stream)
+        self._pending = None
+
+    def is_opened(self):
+        return self.container is not None
+
+    def _next(self):
+        frame, self._pending = self._pending, None
+        return frame if frame is not None else next(self._frames, None)
+
+    def read(self, buffer=None):
+        frame = self._next()
+        if frame is None:
+            return None
+        plane = frame.reformat(format="bgr24").planes[0]
+        # 每行可能有对齐填充，按 line_size 取出有效像素
+        image = np.frombuffer(plane, dtype=np.uint8).reshape(self.height, plane.line_size)[:, :self.width * 3]
+        if buffer is None or buffer.shape != (self.height, self.width, 3):
+            buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        np.copyto(buffer, image.reshape(self.height, self.width, 3))
+        return buffer
+
+    def grab(self):
+        return self._next() is not None
+
+    def seek(self, frame_index):
+        """定位到第 frame_index 帧：跳到之前最近的关键帧，再丢弃目标帧之前解码出的帧"""
+        target = frame_index / self.fps if self.fps else 0.0
+        stream = self._stream
+        self.container.seek(int(target / stream.time_base) + (stream.start_time or 0), stream=stream)
+        self._frames = self.container.decode(stream)
+        self._pending = None
+        for frame in self._frames:
+            if frame.time is None or frame.time >= target - 0.5 / (self.fps or 30):
+                self._pending = frame
+                break
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+
+
+class OpenCVWriter:
+    """cv2.VideoWriter 写入，codec 为 FourCC（不支持 CRF）"""
+
+    def __init__(self, path, fps, size, codec=None, crf=None):
+        if crf is not None:
+            print("OpenCV 写入后端不支持 CRF，已忽略")
+        fourcc = cv2.VideoWriter_fourcc(*(codec or OPENCV_CODEC))
+        self.out = cv2.VideoWriter(path, fourcc, fps, size)
+
+    def write(self, frame):
+        self.out.write(frame)
+
+    def release(self):
+        self.out.release()
+
+
+class PyAVWriter:
+    """PyAV（FFmpeg）写入：可配置编码器和 CRF（质量，越小越清晰），编码器内部多线程"""
+
+    def __init__(self, path, fps, size, codec=None, crf=None, preset=PYAV_PRESET):
+        import av
+        from fractions import Fraction
+
+        self.container = av.open(path, mode="w")
+        self.stream = self.container.add_stream(codec or PYAV_CODEC, rate=Fraction(fps or 30).limit_denominator(1000))
+        self.stream.width, self.stream.height = size
+        self.stream.pix_fmt = "yuv420p"
+        self.stream.thread_type = "AUTO"
+        options = {"crf": str(PYAV_CRF if crf is None else crf)}
+        if preset:
+            options["preset"] = preset
+        self.stream.options = options
+        self._av = av
+
+    def write(self, frame):
+        video_frame = self._av.VideoFrame.from_ndarray(frame, format="bgr24")
+        self.container.mux(self.stream.encode(video_frame))
+
+    def release(self):
+        # 输出编码器中缓存的剩余帧
+        self.container.mux(self.stream.encode(None))
+        self.container.close()
+
+
+_READERS = {"opencv": OpenCVReader, "pyav": PyAVReader}
+_WRITERS = {"opencv": OpenCVWriter, "pyav": PyAVWriter}
+
+
+def open_reader(path, backend=VIDEO_BACKEND):
+    if backend not in _READERS:
+        raise ValueError(f"不支持的视频读写后端: {backend}，可选: {', '.join(_READERS)}")
+    return _READERS[backend](path)
+
+
+def open_writer(path, fps, size, backend=VIDEO_BACKEND, codec=None, crf=None):
+    """size 为 (width, height)，codec/crf 为 None 时使用后端的默认值"""
+    if backend not in _WRITERS:
+        raise ValueError(f"不支持的视频读写后端: {backend}，可选: {', '.join(_WRITERS)}")
+    return _WRITERS[backend](path, fps, size, codec=codec, crf=crf)
+
+
+class FramePool:
+    """
+    循环复用的帧缓冲：解码线程依次把帧解码到池中的缓冲区，避免每帧重新分配内存
+    池大小必须大于流程中同时存在的最大帧数（各队列容量 + 正在处理的批次），缓冲区才不会在使用中被覆盖
+    """
+
+    def __init__(self, size):
+        self.buffers = [None] * max(1, size)
+        self.index = 0
+
+    def read(self, reader):
+        frame = reader.read(self.buffers[self.index])
+        if frame is not None:
+            self.buffers[self.index] = frame
+            self.index = (self.index + 1) % len(self.buffers)
+        return frame
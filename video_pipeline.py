@@ -0,0 +1,621 @@
+import queue
+import threading
+import time
+from itertools import islice, repeat
+
+import cv2
+from tqdm import tqdm
+
+from instrumentation import instrumentation
+from track_store import TrackStateStore
+from vehicle_tracker import VehicleTracker
+from video_io import VIDEO_BACKEND, FramePool, open_reader, open_writer
+
+# 需要统计的车辆类别（与图片处理保持一致）
+VEHICLE_CLASSES = [
+    "bicycle", "car", "van", "truck",
+    "tricycle", "awning-tricycle", "bus", "motor"
+]
+
+
+class LineCounter:
+    """根据轨迹中心点穿越基准线的情况统计入场/出场车辆"""
+
+    def __init__(self, baseline_y, max_track_age=30, fps=None, on_cross=None, record_events=True):
+        self.baseline_y = baseline_y
+        self.fps = fps
+        self.on_cross = on_cross  # 每次计数时回调 on_cross(event)
+        self.record_events = record_events  # 长时间运行的视频流可关闭事件记录
+        # 存储已追踪车辆ID及其状态，长时间未出现的轨迹会被清除
+        self.tracked_vehicles = TrackStateStore(max_age=max_track_age, history_size=10)
+        self.total_in = 0  # 累计入场计数器
+        self.total_out = 0  # 累计出场计数器
+        self.per_class = {}  # 按类别统计 {class_name: {"in": n, "out": n}}
+        self.events = []  # 每次越线的事件记录
+
+    def update(self, boxes, track_ids, class_ids=None):
+        """更新一帧的跟踪结果，返回整数化的 (x1, y1, x2, y2, track_id) 列表用于绘制"""
+        baseline_y = self.baseline_y
+        if class_ids is None:
+            class_ids = repeat(-1)
+        drawn = []
+        for box, track_id, class_id in zip(boxes, track_ids, class_ids):
+            # 获取检测框中心点坐标
+            x1, y1, x2, y2 = map(int, box)
+            center_y = (y1 + y2) // 2
+
+            # 更新轨迹历史（环形缓冲只保留最近 10 帧）
+            vehicle = self.tracked_vehicles.get(track_id, "above" if center_y < baseline_y else "below")
+            vehicle.history.append(center_y)
+
+            # 判断轨迹方向（最近 3 帧）
+            recent = tuple(islice(reversed(vehicle.history), 3))
+            if vehicle.state == "above" and all(y >= baseline_y for y in recent):
+                self.total_in += 1
+                vehicle.state = "counted"
+                self._record(track_id, class_id, "in")
+            elif vehicle.state == "below" and all(y <= baseline_y for y in recent):
+                self.total_out += 1
+                vehicle.state = "counted"
+                self._record(track_id, class_id, "out")
+
+            drawn.append((x1, y1, x2, y2, track_id))
+        self.tracked_vehicles.next_frame()
+        return drawn
+
+    def _record(self, track_id, class_id, direction):
+        class_id = int(class_id)
+        class_name = VEHICLE_CLASSES[class_id] if 0 <= class_id < len(VEHICLE_CLASSES) else "unknown"
+        class_counts = self.per_class.setdefault(class_name, {"in": 0, "out": 0})
+        class_counts[direction] += 1
+
+        frame_index = self.tracked_vehicles.frame_index
+        event = {
+            "frame": frame_index,
+            "timestamp": round(frame_index / self.fps, 3) if self.fps else None,  # 视频内时间（秒）
+            "track_id": int(track_id),
+            "class_id": class_id,
+            "class_name": class_name,
+            "direction": direction,
+            "total_in": self.total_in,
+            "total_out": self.total_out
+        }
+        if self.record_events:
+            self.events.append(event)
+        if self.on_cross is not None:
+            self.on_cross(event)
+
+
+class StageTimer:
+    """累计各阶段耗时，用于定位瓶颈（每个阶段只由一个线程写入），开启 instrumentation 时同时计入全局统计"""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, stage, seconds, count=1):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + count
+        instrumentation.add_time(stage, seconds, count)
+
+    def summary(self):
+        """返回 {stage: {"total_s": 总耗时, "ms_per_frame": 每帧平均耗时}}"""
+        return {
+            stage: {
+                "total_s": round(total, 4),
+                "ms_per_frame": round(total * 1000 / max(self.counts[stage], 1), 3)
+            }
+            for stage, total in self.totals.items()
+        }
+
+
+def latency_summary(latencies):
+    """每帧延迟（秒）的 p50/p95/p99/max，单位毫秒"""
+    values = sorted(latencies)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+    def percentile(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+    return {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+            "max": round(values[-1] * 1000, 2)}
+
+
+def draw_frame(frame, drawn, baseline_y, total_in, total_out):
+    """绘制基准线、检测框、ID和统计信息"""
+    frame_width = frame.shape[1]
+    cv2.line(frame, (0, baseline_y), (frame_width, baseline_y), (0, 0, 255), 2)
+
+    for x1, y1, x2, y2, track_id in drawn:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"ID: {track_id}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+
+    # 显示统计信息
+    info_text = [
+        f"In: {total_in}",
+        f"Out: {total_out}"
+    ]
+    y_offset = 30
+    for text in info_text:
+        cv2.putText(frame, text, (20, y_offset),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        y_offset += 30
+
+
+# 队列结束标记
+_END = object()
+
+
+def _put(q, item, stop_event):
+    """带退出检查的阻塞写入，队列满时等待（背压）"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop_event):
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def _decode_worker(reader, frame_queue, stop_event, timer, errors, pool, retrieve_every=1, start_frame=0,
+                   end_frame=None):
+    """
+    解码线程：按顺序把视频帧解码到帧缓冲池中并放入队列
+    retrieve_every > 1 时只取出需要检测的帧的图像，其余帧只 grab（以 None 占位）
+    从 start_frame（读取器已定位到该帧）读到 end_frame（不含）为止
+    """
+    try:
+        index = start_frame
+        while not stop_event.is_set() and (end_frame is None or index < end_frame):
+            start = time.perf_counter()
+            if index % retrieve_every == 0:
+                frame = pool.read(reader)
+                ret = frame is not None
+            else:
+                ret, frame = reader.grab(), None
+            index += 1
+            if not ret:
+                break
+            timer.add("decode", time.perf_counter() - start)
+            if not _put(frame_queue, frame, stop_event):
+                break
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _put(frame_queue, _END, stop_event)
+
+
+def _encode_worker(out, encode_queue, stop_event, timer, errors):
+    """绘制/编码线程：按顺序绘制结果并写入输出视频"""
+    try:
+        while True:
+            item = _get(encode_queue, stop_event)
+            if item is _END:
+                break
+            frame, drawn, baseline_y, total_in, total_out = item
+            start = time.perf_counter()
+            draw_frame(frame, drawn, baseline_y, total_in, total_out)
+            drawn_at = time.perf_counter()
+            timer.add("draw", drawn_at - start)
+            out.write(frame)
+            timer.add("encode", time.perf_counter() - drawn_at)
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+
+
+def _take_batch(frame_queue, batch_size, stop_event):
+    """从解码队列取出最多 batch_size 帧，返回 (frames, 是否已读完)"""
+    frames = []
+    while len(frames) < batch_size:
+        frame = _get(frame_queue, stop_event)
+        if frame is _END:
+            return frames, True
+        frames.append(frame)
+    return frames, False
+
+
+def new_counting_state(fps, frame_height):
+    """新建跟踪器和越线计数器（基准线在视频中间位置）"""
+    tracker = VehicleTracker("bytetrack.yaml", frame_rate=fps or 30)
+    counter = LineCounter(frame_height // 2, max_track_age=tracker.max_lost_frames, fps=fps)
+    return tracker, counter
+
+
+def run_video_counting(input_video_path, output_video_path, detect_batch, batch_size=1, stride=1,
+                       counts_only=False, queue_size=8, motion_gate=None, io_backend=VIDEO_BACKEND, codec=None,
+                       crf=None, metrics=None, start_frame=0, end_frame=None, state=None):
+    """
+    通用视频计数流程，三个阶段通过有界队列连接并保持帧顺序：
+    解码线程 -> 检测/跟踪/计数（当前线程） -> 绘制/编码线程
+    detect_batch(frames) 需返回每帧的像素坐标 (boxes, scores, labels)
+    stride > 1 时每 stride 帧检测一次，其余帧由跟踪器的运动模型推算位置
+    counts_only=True（或 output_video_path 为 None）时不绘制、不编码输出视频，只返回计数结果
+    motion_gate（MotionGate）不为空时，画面静止的帧跳过检测，同样由跟踪器推算
+    io_backend 为视频读写后端（"opencv"/"pyav"），codec/crf 为输出视频的编码器和质量
+    metrics（MetricsExporter）不为空时每批结束后更新处理帧数（从 start_frame 起累计，分段处理时单调递增）、
+    计数、队列深度和轨迹数
+    start_frame/end_frame 只处理 [start_frame, end_frame) 范围内的帧，输出视频只包含这些帧
+    state 为 new_counting_state() 返回的 (tracker, counter)，传入时在其基础上继续跟踪和计数（用于分段处理）
+    """
+    counts_only = counts_only or output_video_path is None
+    # 视频输入输出设置
+    reader = open_reader(input_video_path, io_backend)
+    if not reader.is_opened():
+        print(f"无法打开视频文件: {input_video_path}")
+        return None
+
+    frame_width = reader.width
+    frame_height = reader.height
+    fps = reader.fps
+    total_frames = reader.frame_count  # 获取视频总帧数
+    if start_frame:
+        reader.seek(start_frame)
+    if end_frame is not None and total_frames > 0:
+        total_frames = min(total_frames, end_frame)
+    total_frames = max(total_frames - start_frame, 0)
+
+    # 初始化视频写入器（仅计数模式不输出视频）
+    out = None
+    if not counts_only:
+        out = open_writer(output_video_path, fps, (frame_width, frame_height), io_backend, codec, crf)
+
+    # 基准线的 y 坐标（视频中间位置）
+    tracker, counter = state if state is not None else new_counting_state(fps, frame_height)
+    batch_size = max(1, int(batch_size))
+    stride = max(1, int(stride))
+
+    # 有界队列提供背压：下游处理不过来时上游阻塞，内存占用有上限
+    frame_queue = queue.Queue(maxsize=max(queue_size, batch_size * 2))
+    encode_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    errors = []
+    timer = StageTimer()
+
+    # 帧缓冲池容量 = 解码队列 + 当前批次 + 编码队列 + 各线程手中正在处理的帧，保证缓冲区不会在使用中被覆盖
+    pool = FramePool(frame_queue.maxsize + batch_size * stride + encode_queue.maxsize + 3)
+
+    # 仅计数模式下跳过的帧不需要图像，只 grab 不解码到内存
+    decoder = threading.Thread(target=_decode_worker,
+                               args=(reader, frame_queue, stop_event, timer, errors, pool,
+                                     stride if counts_only else 1, start_frame, end_frame),
+                               daemon=True)
+    decoder.start()
+    encoder = None
+    if not counts_only:
+        encoder = threading.Thread(target=_encode_worker, args=(out, encode_queue, stop_event, timer, errors),
+                                   daemon=True)
+        encoder.start()
+
+    wall_start = time.perf_counter()
+    frame_count = 0
+    latencies = []  # 每帧从取出解码队列到完成计数的耗时
+    try:
+        # 使用 tqdm 显示进度条
+        with tqdm(total=total_frames, desc="Processing Video", unit="frame") as pbar:
+            finished = False
+            while not finished and not stop_event.is_set():
+                # 每批包含 batch_size 个需要检测的帧
+                frames, finished = _take_batch(frame_queue, batch_size * stride, stop_event)
+                if not frames:
+                    break
+                batch_start = time.perf_counter()
+
+                # 一次前向传播处理整批需要检测的帧
+                detect_flags = [(start_frame + frame_count + i) % stride == 0 for i in range(len(frames))]
+                if motion_gate is not None:
+                    start = time.perf_counter()
+                    checked = sum(detect_flags)
+                    detect_flags = [flag and motion_gate.should_detect(frame)
+                                    for frame, flag in zip(frames, detect_flags)]
+                    timer.add("motion", time.perf_counter() - start, checked)
+                detect_frames = [frame for frame, flag in zip(frames, detect_flags) if flag]
+                start = time.perf_counter()
+                detections = iter(detect_batch(detect_frames) if detect_frames else [])
+                timer.add("infer", time.perf_counter() - start, len(detect_frames))
+
+                # 按帧顺序送入跟踪器并计数
+                for frame, detect in zip(frames, detect_flags):
+                    start = time.perf_counter()
+                    if detect:
+                        boxes, scores, labels = next(detections)
+                        track_boxes, track_ids, track_classes, _ = tracker.update(boxes, scores, labels,
+                                                                                  frame.shape)
+                        instrumentation.count("detections", len(boxes))
+                    else:
+                        # 跳过的帧：由跟踪器预测轨迹位置，计数逻辑照常逐帧更新
+                        track_boxes, track_ids, track_classes, _ = tracker.predict()
+                        instrumentation.count("predicted_frames")
+                    drawn = counter.update(track_boxes, track_ids, track_classes)
+                    timer.add("track", time.perf_counter() - start)
+                    latencies.append(time.perf_counter() - batch_start)
+                    instrumentation.frame_done()
+
+                    if encoder is not None:
+                        _put(encode_queue, (frame, drawn, counter.baseline_y, counter.total_in, counter.total_out),
+                             stop_event)
+                    frame_count += 1
+
+                    # 更新进度条
+                    pbar.update(1)
+
+                if metrics is not None:
+                    metrics.update(frames_processed=start_frame + frame_count, vehicles_in=counter.total_in,
+                                   vehicles_out=counter.total_out, frame_queue_depth=frame_queue.qsize(),
+                                   encode_queue_depth=encode_queue.qsize(),
+                                   active_tracks=len(counter.tracked_vehicles), per_class=counter.per_class)
+        _put(encode_queue, _END, stop_event)
+    except BaseException:
+        # 出错时通知解码/编码线程退出
+        stop_event.set()
+        raise
+    finally:
+        if encoder is not None:
+            encoder.join()
+        stop_event.set()
+        decoder.join()
+
+        # 释放资源
+        reader.release()
+        if out is not None:
+            out.release()
+        cv2.destroyAllWindows()
+        instrumentation.flush()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - wall_start
+    stage_times = _stage_times(timer, detect_batch)
+    print(f"处理完成 | 入场车辆数: {counter.total_in}, 出场车辆数: {counter.total_out}")
+    if not counts_only:
+        print(f"结果视频保存至: {output_video_path}")
+    store_stats = counter.tracked_vehicles.stats()
+    print(f"轨迹状态: 当前 {store_stats['active_tracks']} 条, 峰值 {store_stats['peak_tracks']} 条, "
+          f"已清除 {store_stats['evicted_tracks']} 条, 约 {store_stats['memory_bytes'] / 1024:.1f} KB")
+    print("各阶段耗时: " + ", ".join(f"{stage} {info['ms_per_frame']}ms/帧" for stage, info in stage_times.items()))
+    result = {
+        "total_in": counter.total_in,
+        "total_out": counter.total_out,
+        "per_class": counter.per_class,
+        "events": counter.events,
+        "frames": frame_count,
+        "stride": stride,
+        "fps": round(frame_count / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "stage_times": stage_times,
+        "track_store": store_stats
+    }
+    if motion_gate is not None:
+        result["motion_gate"] = motion_gate.stats()
+        print(f"运动检测: 阈值 {motion_gate.threshold}, 跳过 {result['motion_gate']['skip_fraction']:.1%} 的检测帧")
+    return result
+
+
+def _stage_times(timer, detect_batch):
+    """流程各阶段耗时，检测器自身提供 stage_times()（如集成检测器的各模型耗时）时一并合入"""
+    stage_times = timer.summary()
+    if hasattr(detect_batch, "stage_times"):
+        stage_times.update(detect_batch.stage_times())
+    return stage_times
+
+
+def _open_source(source):
+    """打开任意 cv2.VideoCapture 支持的输入：摄像头编号、RTSP/HTTP 地址、文件或命名管道"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+
+def _capture_worker(cap, frame_queue, stop_event, errors, loop, pace_fps):
+    """采集线程：持续读取最新帧，队列满时丢弃最旧的帧，保证处理的总是最新画面"""
+    try:
+        index = 0
+        interval = 1.0 / pace_fps if pace_fps else 0.0
+        next_time = time.perf_counter()
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret and loop:
+                # 循环播放的本地文件，用于模拟实时视频流
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = cap.read()
+            if not ret:
+                break
+            if interval:
+                # 按源帧率节流，模拟实时输入
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            item = (index, time.perf_counter(), frame)
+            index += 1
+            try:
+                frame_queue.put_nowait(item)
+            except queue.Full:
+                try:
+                    frame_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                frame_queue.put_nowait(item)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _put(frame_queue, _END, stop_event)
+
+
+def _print_crossing(event):
+    print(f"[帧 {event['frame']}] {'入场' if event['direction'] == 'in' else '出场'} ID: {event['track_id']} | "
+          f"In: {event['total_in']}, Out: {event['total_out']}")
+
+
+def run_stream_counting(source, detect_batch, latency_budget=0.5, output_video_path=None, on_count=None,
+                        stop_event=None, max_frames=None, loop=False, pace_fps=None, queue_size=2,
+                        io_backend=VIDEO_BACKEND, codec=None, crf=None, metrics=None):
+    """
+    实时视频流计数：输入可以是摄像头、RTSP、循环播放的文件或命名管道
+    - 推理跟不上时丢帧：等待超过 latency_budget 秒且已有更新的帧时直接跳过，端到端延迟有上限
+    - 丢弃的帧由跟踪器运动模型补齐，计数逻辑仍逐帧更新
+    - 每次发生入场/出场计数时立即回调 on_count(event)，默认打印
+    - stop_event 被设置、达到 max_frames 或输入结束时停止
+    - 输出视频（可选）使用 io_backend 指定的写入后端，codec/crf 为编码器和质量
+    - metrics（MetricsExporter）不为空时每帧更新处理/丢弃帧数、计数、队列深度和轨迹数
+    """
+    cap = _open_source(source)
+    if not cap.isOpened():
+        print(f"无法打开视频流: {source}")
+        return None
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if pace_fps is True:
+        pace_fps = fps or 30
+
+    out = None
+    if output_video_path:
+        out = open_writer(output_video_path, fps or 30, (frame_width, frame_height), io_backend, codec, crf)
+
+    on_count = on_count or _print_crossing
+    stop_event = stop_event or threading.Event()
+    tracker = VehicleTracker("bytetrack.yaml", frame_rate=fps or 30)
+
+    def emit(event):
+        event["time"] = time.time()  # 实际发生时间
+        on_count(event)
+
+    # 长时间运行不保存事件列表，事件通过回调实时发出
+    counter = LineCounter(frame_height // 2, max_track_age=tracker.max_lost_frames, fps=fps, on_cross=emit,
+                          record_events=False)
+
+    frame_queue = queue.Queue(maxsize=max(1, queue_size))
+    errors = []
+    capture = threading.Thread(target=_capture_worker,
+                               args=(cap, frame_queue, stop_event, errors, loop, pace_fps), daemon=True)
+    capture.start()
+
+    timer = StageTimer()
+    latencies = []
+    processed = 0
+    last_index = -1
+    wall_start = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            item = _get(frame_queue, stop_event)
+            if item is _END:
+                break
+            index, captured_at, frame = item
+
+            # 已经超出延迟预算且有更新的帧在等待，跳过这一帧
+            if time.perf_counter() - captured_at > latency_budget and not frame_queue.empty():
+                continue
+
+            # 被丢弃的帧用跟踪器预测补齐，保证轨迹历史逐帧连续
+            if index - last_index > 1:
+                start = time.perf_counter()
+                for _ in range(last_index + 1, index):
+                    track_boxes, track_ids, track_classes, _ = tracker.predict()
+                    counter.update(track_boxes, track_ids, track_classes)
+                timer.add("predict", time.perf_counter() - start, index - last_index - 1)
+
+            start = time.perf_counter()
+            boxes, scores, labels = detect_batch([frame])[0]
+            timer.add("infer", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            track_boxes, track_ids, track_classes, _ = tracker.update(boxes, scores, labels, frame.shape)
+            drawn = counter.update(track_boxes, track_ids, track_classes)
+            timer.add("track", time.perf_counter() - start)
+
+            if out is not None:
+                start = time.perf_counter()
+                draw_frame(frame, drawn, counter.baseline_y, counter.total_in, counter.total_out)
+                drawn_at = time.perf_counter()
+                timer.add("draw", drawn_at - start)
+                out.write(frame)
+                timer.add("encode", time.perf_counter() - drawn_at)
+
+            latencies.append(time.perf_counter() - captured_at)
+            instrumentation.frame_done()
+            last_index = index
+            processed += 1
+            if metrics is not None:
+                metrics.update(frames_processed=processed, frames_dropped=index + 1 - processed,
+                               vehicles_in=counter.total_in, vehicles_out=counter.total_out,
+                               frame_queue_depth=frame_queue.qsize(), active_tracks=len(counter.tracked_vehicles),
+                               per_class=counter.per_class)
+            if max_frames is not None and index + 1 >= max_frames:
+                break
+    except KeyboardInterrupt:
+        print("已手动停止")
+    finally:
+        stop_event.set()
+        capture.join()
+        cap.release()
+        if out is not None:
+            out.release()
+        instrumentation.flush()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - wall_start
+    received = last_index + 1
+    result = {
+        "total_in": counter.total_in,
+        "total_out": counter.total_out,
+        "per_class": counter.per_class,
+        "frames_received": received,
+        "frames_processed": processed,
+        "frames_dropped": received - processed,
+        "fps": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "stage_times": _stage_times(timer, detect_batch),
+        "track_store": counter.tracked_vehicles.stats()
+    }
+    print(f"视频流结束 | 入场车辆数: {counter.total_in}, 出场车辆数: {counter.total_out}, "
+          f"处理 {processed} 帧, 丢弃 {received - processed} 帧")
+    return result
+
+
+def compare_strides(count_video, input_video_path, strides=(1, 2, 3, 5)):
+    """
+    用不同 stride 运行同一视频（仅计数模式），报告各 stride 的计数相对全帧率（stride=1）的偏差和速度，
+    便于根据实际数据选择 stride。count_video 为 count_vehicles_video 函数
+    """
+    if 1 not in strides:
+        strides = (1,) + tuple(strides)
+    report = []
+    for stride in sorted(set(strides)):
+        result = count_video(input_video_path, None, stride=stride, counts_only=True)
+        if result is None:
+            return None
+        report.append({
+            "stride": stride,
+            "total_in": result["total_in"],
+            "total_out": result["total_out"],
+            "fps": result["fps"]
+        })
+
+    baseline = report[0]
+    for row in report:
+        row["drift_in"] = row["total_in"] - baseline["total_in"]
+        row["drift_out"] = row["total_out"] - baseline["total_out"]
+        baseline_total = baseline["total_in"] + baseline["total_out"]
+        drift_total = abs(row["drift_in"]) + abs(row["drift_out"])
+        row["drift_ratio"] = round(drift_total / baseline_total, 4) if baseline_total else 0.0
+        row["speedup"] = round(row["fps"] / baseline["fps"], 2) if baseline["fps"] else 0.0
+        print(f"stride={row['stride']}: 入场 {row['total_in']} ({row['drift_in']:+d}), "
+              f"出场 {row['total_out']} ({row['drift_out']:+d}), 偏差 {row['drift_ratio']:.2%}, "
+              f"加速 {row['speedup']}x")
+    return report
@@ -0,0 +1,201 @@
+import numpy as np
+
+# 单个类别的框数不超过该值时直接逐框聚类，不做分组
+SEQUENTIAL_MAX_BOXES = 16
+
+
+def _prefilter(boxes_list, scores_list, labels_list, weights, skip_box_thr):
+    """
+    向量化的预处理（与 ensemble_boxes.prefilter_boxes 规则一致）：
+    过滤低分框、交换颠倒的坐标、裁剪到 [0, 1]、丢弃面积为 0 的框，
+    返回按 (模型顺序, 框顺序) 拼接的 labels、加权分数、坐标
+    """
+    all_labels, all_scores, all_boxes = [], [], []
+    for t in range(len(boxes_list)):
+        scores = np.asarray(scores_list[t], dtype=np.float64).reshape(-1)
+        if len(scores) == 0:
+            continue
+        boxes = np.asarray(boxes_list[t], dtype=np.float64).reshape(-1, 4)
+        labels = np.asarray(labels_list[t]).reshape(-1).astype(int)
+        x1 = np.clip(np.minimum(boxes[:, 0], boxes[:, 2]), 0, 1)
+        x2 = np.clip(np.maximum(boxes[:, 0], boxes[:, 2]), 0, 1)
+        y1 = np.clip(np.minimum(boxes[:, 1], boxes[:, 3]), 0, 1)
+        y2 = np.clip(np.maximum(boxes[:, 1], boxes[:, 3]), 0, 1)
+        keep = (scores >= skip_box_thr) & ((x2 - x1) * (y2 - y1) != 0.0)
+        all_labels.append(labels[keep])
+        all_scores.append(scores[keep] * weights[t])
+        all_boxes.append(np.stack([x1, y1, x2, y2], axis=1)[keep])
+    if not all_labels:
+        return np.zeros(0, dtype=int), np.zeros(0), np.zeros((0, 4))
+    return np.concatenate(all_labels), np.concatenate(all_scores), np.concatenate(all_boxes)
+
+
+def _overlap_groups(boxes, margin=1e-6):
+    """
+    把同一类别的框划分为互不相交的组：不断合并外接框（组内所有框的包围盒）相交的组，直到稳定。
+    融合框是组内框坐标的加权平均，不会超出组的外接框，因此不同组之间的IoU恒为0，可以分别聚类
+    返回每个框的组编号（组内最小的框序号）
+    """
+    n = len(boxes)
+    groups = np.arange(n)
+    while True:
+        ids, inverse = np.unique(groups, return_inverse=True)
+        hulls = np.empty((len(ids), 4))
+        hulls[:, :2] = np.inf
+        hulls[:, 2:] = -np.inf
+        np.minimum.at(hulls[:, 0], inverse, boxes[:, 0])
+        np.minimum.at(hulls[:, 1], inverse, boxes[:, 1])
+        np.maximum.at(hulls[:, 2], inverse, boxes[:, 2])
+        np.maximum.at(hulls[:, 3], inverse, boxes[:, 3])
+        # 外接框两两相交矩阵（留一点余量，覆盖float32舍入误差）
+        overlap = (
+            (np.minimum(hulls[:, None, 2], hulls[None, :, 2]) - np.maximum(hulls[:, None, 0], hulls[None, :, 0]) > -margin)
+            & (np.minimum(hulls[:, None, 3], hulls[None, :, 3]) - np.maximum(hulls[:, None, 1], hulls[None, :, 1]) > -margin)
+        )
+        merged = np.where(overlap, ids[None, :], n).min(axis=1)
+        if np.array_equal(merged, ids):
+            return groups
+        groups = merged[inverse]
+        # 标签传递：组编号取相连组中的最小值，直到不再变化
+        while True:
+            updated = groups[groups]
+            if np.array_equal(updated, groups):
+                break
+            groups = updated
+
+
+def _cluster_sequential(scores, boxes, weighted, areas, iou_thr):
+    """
+    对已按分数降序排列的框逐个聚类：每个框与当前所有融合框一次性计算IoU，
+    匹配上则增量更新该簇的加权坐标（无需重新遍历簇内所有框）
+    返回每个簇的首个框序号、融合坐标、平均分数和框数
+    """
+    n = len(scores)
+    first = np.empty(n, dtype=int)
+    fused = np.empty((n, 4), dtype=np.float64)        # 当前融合框坐标（用于匹配）
+    fused_scores = np.empty(n, dtype=np.float64)
+    coord_sums = np.zeros((n, 4), dtype=np.float32)   # 分数加权的坐标和
+    fused_areas = np.empty(n, dtype=np.float64)
+    conf_sums = {}
+    counts = np.zeros(n, dtype=int)
+    k = 0
+    for j in range(n):
+        box = boxes[j]
+        if k > 0:
+            current = fused[:k]
+            inter = np.maximum(np.minimum(current[:, 2:], box[2:]) - np.maximum(current[:, :2], box[:2]), 0)
+            inter = inter[:, 0] * inter[:, 1]
+            ious = inter / (fused_areas[:k] + areas[j] - inter)
+            index = int(np.argmax(ious))
+            if ious[index] > iou_thr:
+                # 匹配成功：增量更新簇的加权坐标和平均分数
+                coord_sums[index] += weighted[j]
+                conf_sums[index] += scores[j]
+                counts[index] += 1
+                fused[index] = (coord_sums[index].astype(np.float64) / conf_sums[index]).astype(np.float32)
+                fused_scores[index] = np.float32(conf_sums[index] / counts[index])
+                x1, y1, x2, y2 = fused[index]
+                fused_areas[index] = (x2 - x1) * (y2 - y1)
+                continue
+
+        # 新建簇：单个框的簇直接使用原始坐标和分数
+        first[k] = j
+        fused[k] = box
+        fused_scores[k] = scores[j]
+        fused_areas[k] = areas[j]
+        coord_sums[k] += weighted[j]
+        conf_sums[k] = scores[j]
+        counts[k] = 1
+        k += 1
+    return first[:k], fused[:k], fused_scores[:k], counts[:k]
+
+
+def _cluster_pairs(scores, boxes, weighted, areas, iou_thr, first, second):
+    """只有两个框的组：IoU 超过阈值则融合为一个簇，否则各自成簇（整批向量化计算）"""
+    inter = np.maximum(np.minimum(boxes[first, 2:], boxes[second, 2:]) - np.maximum(boxes[first, :2], boxes[second, :2]),
+                       0)
+    inter = inter[:, 0] * inter[:, 1]
+    ious = inter / (areas[first] + areas[second] - inter)
+    match = ious > iou_thr
+    a, b = first[match], second[match]
+    coord_sums = weighted[a].astype(np.float32)
+    coord_sums += weighted[b]
+    conf_sums = scores[a] + scores[b]
+    merged_boxes = (coord_sums.astype(np.float64) / conf_sums[:, None]).astype(np.float32)
+    merged_scores = (conf_sums / 2).astype(np.float32)
+    singles = np.concatenate([first[~match], second[~match]])
+    return (
+        np.concatenate([a, singles]),
+        np.concatenate([merged_boxes, boxes[singles]]),
+        np.concatenate([merged_scores, scores[singles]]),
+        np.concatenate([np.full(len(a), 2), np.ones(len(singles), dtype=int)])
+    )
+
+
+def _cluster_label(scores, boxes, iou_thr):
+    """
+    对同一类别、已按分数降序排列的框做聚类，结果与逐框顺序聚类完全一致：
+    先按外接框划分互不影响的组，单框组直接成簇，双框组批量计算，其余组逐框聚类
+    返回按创建顺序排列的簇坐标、平均分数和框数
+    """
+    weighted = scores[:, None] * boxes
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if len(scores) <= SEQUENTIAL_MAX_BOXES:
+        # 框很少时分组的开销大于收益，直接逐框聚类
+        _, *clusters = _cluster_sequential(scores, boxes, weighted, areas, iou_thr)
+        return tuple(clusters)
+    groups = _overlap_groups(boxes)
+    order = np.argsort(groups, kind="stable")
+    ids, starts, sizes = np.unique(groups[order], return_index=True, return_counts=True)
+
+    singles = order[starts[sizes == 1]]
+    parts = [(singles, boxes[singles], scores[singles], np.ones(len(singles), dtype=int))]
+    pair_starts = starts[sizes == 2]
+    if len(pair_starts):
+        parts.append(_cluster_pairs(scores, boxes, weighted, areas, iou_thr,
+                                    order[pair_starts], order[pair_starts + 1]))
+    for start, size in zip(starts[sizes > 2], sizes[sizes > 2]):
+        members = order[start:start + size]
+        first, *clusters = _cluster_sequential(scores[members], boxes[members], weighted[members], areas[members],
+                                               iou_thr)
+        parts.append((members[first], *clusters))
+
+    # 按簇的首个框在排序中的位置恢复创建顺序
+    first = np.concatenate([part[0] for part in parts])
+    creation = np.argsort(first)
+    return tuple(np.concatenate([part[i] for part in parts])[creation] for i in (1, 2, 3))
+
+
+def weighted_boxes_fusion(boxes_list, scores_list, labels_list, weights=None, iou_thr=0.55, skip_box_thr=0.0):
+    """
+    加权框融合（WBF），结果与 ensemble_boxes.weighted_boxes_fusion（conf_type="avg"）一致
+    boxes_list: 每个模型的归一化坐标 [x1, y1, x2, y2]，scores_list / labels_list 与之对应
+    weights: 每个模型的权重，默认均为 1
+    返回 (boxes, scores, labels)，按分数降序排列
+    """
+    if weights is None or len(weights) != len(boxes_list):
+        weights = np.ones(len(boxes_list))
+    weights = np.array(weights)
+
+    labels, scores, boxes = _prefilter(boxes_list, scores_list, labels_list, weights, skip_box_thr)
+    if len(labels) == 0:
+        return np.zeros((0, 4)), np.zeros((0,)), np.zeros((0,))
+
+    # 按类别分组，类别顺序与首次出现的顺序一致
+    unique_labels, first_index = np.unique(labels, return_index=True)
+    fused_boxes, fused_scores, fused_labels = [], [], []
+    for label in unique_labels[np.argsort(first_index)]:
+        members = np.flatnonzero(labels == label)
+        order = members[scores[members].argsort()[::-1]]
+        label_boxes, label_scores, counts = _cluster_label(scores[order], boxes[order], iou_thr)
+        # 按参与融合的模型数缩放分数（不允许超过 1）
+        label_scores = label_scores * np.minimum(len(weights), counts) / weights.sum()
+        fused_boxes.append(label_boxes)
+        fused_scores.append(label_scores)
+        fused_labels.append(np.full(len(label_scores), label, dtype=np.float64))
+
+    fused_boxes = np.concatenate(fused_boxes)
+    fused_scores = np.concatenate(fused_scores)
+    fused_labels = np.concatenate(fused_labels)
+    order = fused_scores.argsort()[::-1]
+    return fused_boxes[order], fused_scores[order], fused_labels[order]